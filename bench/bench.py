@@ -0,0 +1,442 @@
+"""End-to-end throughput/latency benchmark for the green evaluation pipeline.
+
+Starts a mock LLM server, N purple agents (mock mode) and the green server on
+localhost, drives evaluations through the A2A ``message/send`` path at fixed
+concurrency levels and writes a machine-readable JSON report. Optionally compares
+the report against a stored baseline and fails on regressions.
+
+Example:
+    python bench/bench.py --purples 2 --concurrency 1,4 --evaluations 8 --output bench_output.json
+    python bench/bench.py --baseline bench/baseline.json --fail-on-regression
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+
+try:
+    import httpx
+except ImportError:
+    print("Error: httpx required. Install with: pip install httpx")
+    sys.exit(1)
+
+
+ROOT = Path(__file__).resolve().parent.parent
+GREEN_DIR = ROOT / "green"
+PURPLE_DIR = ROOT / "purple"
+
+STAGE_METRIC = "green_stage_seconds"
+_BUCKET_RE = re.compile(rf'^{STAGE_METRIC}_bucket\{{(?P<labels>[^}}]*)\}} (?P<value>\S+)$')
+_LABEL_RE = re.compile(r'(\w+)="([^"]*)"')
+
+
+# =========================
+# Process management
+# =========================
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(url: str, proc: subprocess.Popen, timeout: float) -> float:
+    """Poll ``url`` until it answers 200; returns seconds waited."""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Process exited early ({proc.returncode}) while waiting for {url}")
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return time.perf_counter() - start
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.05)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+
+def peak_rss_mb(pid: int) -> Optional[float]:
+    """Peak resident set size (VmHWM) of a process, Linux only."""
+    try:
+        with open(f"/proc/{pid}/status", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+class Cluster:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.workdir = Path(tempfile.mkdtemp(prefix="agentbeats-bench-"))
+        self.procs: List[subprocess.Popen] = []
+        self.logs = []
+        self.startup: Dict[str, Any] = {}
+        self.purple_urls: List[str] = []
+        self.purple_procs: List[subprocess.Popen] = []
+        self.green_url = ""
+        self.green_proc: Optional[subprocess.Popen] = None
+
+    def _spawn(self, name: str, cmd: List[str], cwd: Path, env: Dict[str, str]) -> subprocess.Popen:
+        log = open(self.workdir / f"{name}.log", "w", encoding="utf-8")
+        self.logs.append(log)
+        proc = subprocess.Popen(cmd, cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT)
+        self.procs.append(proc)
+        return proc
+
+    def start(self):
+        args = self.args
+        base_env = {**os.environ, "PYTHONUNBUFFERED": "1"}
+
+        # mock LLM
+        llm_port = free_port()
+        llm_proc = self._spawn(
+            "mock_llm",
+            [sys.executable, "mock_llm.py", "--port", str(llm_port),
+             "--latency", args.llm_latency, "--error-rate", str(args.llm_error_rate), "--seed", str(args.seed)],
+            GREEN_DIR, base_env,
+        )
+        self.startup["mock_llm_seconds"] = round(wait_ready(f"http://127.0.0.1:{llm_port}/health", llm_proc, 30), 3)
+
+        # purple agents
+        purple_startup = []
+        for i in range(args.purples):
+            port = free_port()
+            url = f"http://127.0.0.1:{port}"
+            proc = self._spawn(
+                f"purple_{i}",
+                [sys.executable, "server.py", "--port", str(port), "--card-url", url,
+                 "--mock", "--mock-latency", args.purple_latency,
+                 "--mock-error-rate", str(args.purple_error_rate), "--mock-seed", str(args.seed + i)],
+                PURPLE_DIR, base_env,
+            )
+            purple_startup.append(round(wait_ready(f"{url}/.well-known/agent-card.json", proc, 60), 3))
+            self.purple_urls.append(url)
+            self.purple_procs.append(proc)
+        self.startup["purple_seconds"] = purple_startup
+
+        # green，复制到临时目录运行，避免结果文件和缓存写进仓库
+        green_copy = self.workdir / "green"
+        shutil.copytree(GREEN_DIR, green_copy, ignore=shutil.ignore_patterns("results", "cache", "__pycache__"))
+        green_env = {
+            **base_env,
+            "DEEPSEEK_API_KEY": "mock",
+            "DEEPSEEK_URL": f"http://127.0.0.1:{llm_port}/v1/chat/completions",
+            "LLM_CACHE_BYPASS": "0" if args.llm_cache else "1",
+        }
+        port = free_port()
+        self.green_url = f"http://127.0.0.1:{port}"
+        cmd = [sys.executable, "server.py", "--port", str(port), "--card-url", self.green_url, "--warmup", args.warmup]
+        self.green_proc = self._spawn("green", cmd, green_copy, green_env)
+        # green_seconds: 端口可用；green_ready_seconds: 模型预热完成（/ready 返回 200）
+        bind = wait_ready(f"{self.green_url}/.well-known/agent-card.json", self.green_proc, args.startup_timeout)
+        ready = wait_ready(f"{self.green_url}/ready", self.green_proc, args.startup_timeout)
+        self.startup["green_seconds"] = round(bind, 3)
+        self.startup["green_ready_seconds"] = round(bind + ready, 3)
+
+    def peak_rss(self) -> Dict[str, Any]:
+        return {
+            "green": peak_rss_mb(self.green_proc.pid) if self.green_proc else None,
+            "purple": [peak_rss_mb(p.pid) for p in self.purple_procs],
+        }
+
+    def stop(self):
+        for proc in self.procs:
+            if proc.poll() is None:
+                proc.terminate()
+        for proc in self.procs:
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        for log in self.logs:
+            log.close()
+        if not self.args.keep_workdir:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+# =========================
+# Load generation
+# =========================
+def eval_request(purple_url: str, config: Dict[str, Any]) -> Dict[str, Any]:
+    payload = {"participants": {"purple_agent": purple_url}, "config": config}
+    return {
+        "jsonrpc": "2.0",
+        "id": uuid4().hex,
+        "method": "message/send",
+        "params": {
+            "message": {
+                "kind": "message",
+                "role": "user",
+                "messageId": uuid4().hex,
+                "parts": [{"kind": "text", "text": json.dumps(payload)}],
+            },
+            "configuration": {"blocking": True},
+        },
+    }
+
+
+async def run_level(cluster: Cluster, concurrency: int, evaluations: int, personas: List[Optional[str]], task_count: int, timeout: float) -> Dict[str, Any]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    failures = 0
+
+    async with httpx.AsyncClient(timeout=timeout, limits=httpx.Limits(max_connections=concurrency * 2)) as client:
+
+        async def one(i: int):
+            nonlocal failures
+            config: Dict[str, Any] = {"task_count": task_count}
+            persona = personas[i % len(personas)]
+            if persona is not None:
+                config["persona"] = persona
+            body = eval_request(cluster.purple_urls[i % len(cluster.purple_urls)], config)
+
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    resp = await client.post(cluster.green_url + "/", json=body)
+                    result = resp.json().get("result") or {}
+                    ok = resp.status_code == 200 and result.get("status", {}).get("state") == "completed"
+                except Exception:
+                    ok = False
+                elapsed = time.perf_counter() - start
+
+            if ok:
+                latencies.append(elapsed)
+            else:
+                failures += 1
+
+        before = scrape_stage_buckets(cluster.green_url)
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(evaluations)))
+        wall = time.perf_counter() - start
+        after = scrape_stage_buckets(cluster.green_url)
+
+    completed = len(latencies)
+    return {
+        "concurrency": concurrency,
+        "evaluations": evaluations,
+        "completed": completed,
+        "failed": failures,
+        "wall_seconds": round(wall, 3),
+        "evaluations_per_minute": round(completed / wall * 60, 2) if wall > 0 else 0.0,
+        "latency_seconds": summarize(latencies),
+        "stages": stage_quantiles(before, after),
+    }
+
+
+# =========================
+# Statistics
+# =========================
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q
+    lo, hi = math.floor(rank), math.ceil(rank)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (rank - lo)
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {
+        "p50": round(percentile(values, 0.50), 4),
+        "p95": round(percentile(values, 0.95), 4),
+        "p99": round(percentile(values, 0.99), 4),
+        "mean": round(sum(values) / len(values), 4) if values else 0.0,
+    }
+
+
+def scrape_stage_buckets(green_url: str) -> Dict[str, Dict[float, float]]:
+    """Cumulative bucket counts of the stage histogram, summed over outcomes, keyed by stage."""
+    text = httpx.get(f"{green_url}/metrics", timeout=10).text
+    buckets: Dict[str, Dict[float, float]] = {}
+    for line in text.splitlines():
+        m = _BUCKET_RE.match(line)
+        if not m:
+            continue
+        labels = dict(_LABEL_RE.findall(m.group("labels")))
+        le = math.inf if labels["le"] == "+Inf" else float(labels["le"])
+        stage = buckets.setdefault(labels.get("stage", "unknown"), {})
+        stage[le] = stage.get(le, 0.0) + float(m.group("value"))
+    return buckets
+
+
+def histogram_quantile(q: float, buckets: List[tuple]) -> float:
+    """Prometheus-style quantile estimate from sorted (upper_bound, cumulative_count) pairs."""
+    total = buckets[-1][1]
+    if total <= 0:
+        return 0.0
+    target = q * total
+    prev_bound, prev_count = 0.0, 0.0
+    for bound, count in buckets:
+        if count >= target:
+            if math.isinf(bound):
+                return prev_bound
+            width = count - prev_count
+            frac = (target - prev_count) / width if width > 0 else 0.0
+            return prev_bound + (bound - prev_bound) * frac
+        prev_bound, prev_count = bound, count
+    return prev_bound
+
+
+def stage_quantiles(before: Dict[str, Dict[float, float]], after: Dict[str, Dict[float, float]]) -> Dict[str, Dict[str, float]]:
+    stages = {}
+    for stage, series in after.items():
+        prior = before.get(stage, {})
+        delta = sorted((le, count - prior.get(le, 0.0)) for le, count in series.items())
+        count = delta[-1][1] if delta else 0
+        if count <= 0:
+            continue
+        stages[stage] = {
+            "count": int(count),
+            "p50": round(histogram_quantile(0.50, delta), 4),
+            "p95": round(histogram_quantile(0.95, delta), 4),
+            "p99": round(histogram_quantile(0.99, delta), 4),
+        }
+    return stages
+
+
+# =========================
+# Baseline comparison
+# =========================
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    regressions = []
+    base_levels = {lvl["concurrency"]: lvl for lvl in baseline.get("levels", [])}
+
+    for lvl in report["levels"]:
+        base = base_levels.get(lvl["concurrency"])
+        if base is None:
+            continue
+        c = lvl["concurrency"]
+
+        if lvl["evaluations_per_minute"] < base["evaluations_per_minute"] * (1 - tolerance):
+            regressions.append(
+                f"c={c}: throughput {lvl['evaluations_per_minute']} < baseline {base['evaluations_per_minute']} evals/min"
+            )
+        for q in ("p95", "p99"):
+            cur, ref = lvl["latency_seconds"][q], base["latency_seconds"][q]
+            if ref > 0 and cur > ref * (1 + tolerance):
+                regressions.append(f"c={c}: end-to-end {q} {cur}s > baseline {ref}s")
+        for stage, stats in lvl["stages"].items():
+            ref = base.get("stages", {}).get(stage, {}).get("p95", 0)
+            if ref > 0 and stats["p95"] > ref * (1 + tolerance):
+                regressions.append(f"c={c}: stage {stage} p95 {stats['p95']}s > baseline {ref}s")
+
+    for key in ("green",):
+        cur, ref = report["peak_rss_mb"].get(key), baseline.get("peak_rss_mb", {}).get(key)
+        if cur and ref and cur > ref * (1 + tolerance):
+            regressions.append(f"{key} peak RSS {cur}MB > baseline {ref}MB")
+
+    for key in ("green_seconds", "green_ready_seconds"):
+        cur, ref = report["startup"].get(key), baseline.get("startup", {}).get(key)
+        if cur and ref and cur > ref * (1 + tolerance):
+            regressions.append(f"startup {key} {cur}s > baseline {ref}s")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark green evaluation throughput and latency on localhost.")
+    parser.add_argument("--purples", type=int, default=2, help="Number of mock purple agents")
+    parser.add_argument("--concurrency", type=str, default="1,4", help="Comma-separated concurrency levels")
+    parser.add_argument("--evaluations", type=int, default=8, help="Evaluations per concurrency level")
+    parser.add_argument("--personas", type=str, default="", help="Comma-separated personas to rotate through; 'all' for the multi-persona mode; default: first persona")
+    parser.add_argument("--task-count", type=int, default=3)
+    parser.add_argument("--llm-latency", type=str, default="lognormal:50,0.5")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-cache", action="store_true", help="Keep the green LLM response cache enabled")
+    parser.add_argument("--purple-latency", type=str, default="lognormal:20,0.5")
+    parser.add_argument("--purple-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--warmup", type=str, default="background", choices=["background", "blocking", "off"], help="Green warm-up mode")
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    parser.add_argument("--request-timeout", type=float, default=600)
+    parser.add_argument("--output", type=str, default="bench_output.json")
+    parser.add_argument("--baseline", type=str, help="Baseline report to compare against")
+    parser.add_argument("--save-baseline", type=str, help="Also write this report to the given baseline path")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative regression vs baseline")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--keep-workdir", action="store_true")
+    args = parser.parse_args()
+
+    levels = [int(x) for x in args.concurrency.split(",") if x.strip()]
+    if args.personas == "all":
+        personas: List[Optional[str]] = [None]
+    elif args.personas:
+        personas = [p.strip() for p in args.personas.split(",") if p.strip()]
+    else:
+        with open(GREEN_DIR / "data" / "personas" / "personas.json", "r", encoding="utf-8") as f:
+            personas = [json.load(f)[0]["name"]]
+
+    cluster = Cluster(args)
+    try:
+        cluster.start()
+        print(f"Cluster ready: green={cluster.green_url}, purples={cluster.purple_urls}, startup={cluster.startup}")
+
+        results = []
+        for c in levels:
+            level = asyncio.run(run_level(cluster, c, args.evaluations, personas, args.task_count, args.request_timeout))
+            print(
+                f"c={c}: {level['completed']}/{level['evaluations']} ok, "
+                f"{level['evaluations_per_minute']} evals/min, p95={level['latency_seconds']['p95']}s"
+            )
+            results.append(level)
+
+        report = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "purples": args.purples,
+                "personas": personas,
+                "task_count": args.task_count,
+                "llm_latency": args.llm_latency,
+                "purple_latency": args.purple_latency,
+                "llm_cache": args.llm_cache,
+                "warmup": args.warmup,
+                "python": sys.version.split()[0],
+            },
+            "startup": cluster.startup,
+            "levels": results,
+            "peak_rss_mb": cluster.peak_rss(),
+        }
+    finally:
+        cluster.stop()
+
+    regressions: List[str] = []
+    if args.baseline:
+        if os.path.exists(args.baseline):
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                regressions = compare(report, json.load(f), args.tolerance)
+            report["regressions"] = regressions
+        else:
+            print(f"Baseline {args.baseline} not found, skipping comparison")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    for r in regressions:
+        print(f"REGRESSION: {r}")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
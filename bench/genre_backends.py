@@ -0,0 +1,122 @@
+"""Side-by-side comparison of the two consistency backends (embedding vs lookup).
+
+Catalog titles are split into K folds. For each fold the hashing classifier is
+trained on the other folds and both backends label the held-out titles with the
+catalog override turned off, so every number comes from inference alone. A set
+of junk / placeholder titles checks that unsure titles get no genres.
+
+Consistency is computed with ``Evaluator.score_consistency`` on synthetic
+outputs (``--outputs`` lists of ``--k`` held-out titles per persona) and compared
+against the same outputs scored with the true catalog genres.
+
+Example:
+    python bench/genre_backends.py --folds 5 --output genre_backends.json
+"""
+
+import argparse
+import json
+import random
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+GREEN_DIR = ROOT / "green"
+sys.path.insert(0, str(GREEN_DIR))
+
+from catalog import CatalogIndex  # noqa: E402
+from evaluator import Evaluator  # noqa: E402
+from genre_lookup import GenreLookup  # noqa: E402
+
+JUNK_TITLES = [
+    "Unknown Zzz", "Movie A", "Movie B", "Film 3", "Untitled", "asdf qwer", "Xyzzy",
+    "Foo Bar Baz", "N/A", "Item 42", "Qwerty Uiop", "Lorem Ipsum", "Test Movie", "Blorp",
+    "Zzz", "Random Title 7", "ABC", "Placeholder", "Something", "Unknown",
+]
+
+
+def embedding_genres(evaluator: Evaluator, titles: List[str], threshold: float = 0.3) -> List[List[str]]:
+    """Embedding backend without the catalog override."""
+    hits = (evaluator._encode_titles(titles) @ evaluator.genre_matrix.T) >= threshold
+    return [[evaluator.genre_names[j] for j in np.flatnonzero(row)] for row in hits]
+
+
+def consistency(evaluator: Evaluator, genres: Dict[str, List[str]], personas: List[dict], outputs: List[List[str]]) -> float:
+    evaluator.infer_genres_batch = lambda titles, threshold=0.3: [genres[t] for t in titles]
+    outs = [{"prediction": preds} for preds in outputs]
+    return float(np.mean([evaluator.score_consistency(p, outs) for p in personas]))
+
+
+def summarize(genres: Dict[str, List[str]], truth: Dict[str, List[str]], junk: Dict[str, List[str]]) -> Dict[str, float]:
+    labeled = [t for t in truth if genres[t]]
+    ious = [len(set(genres[t]) & set(truth[t])) / len(set(genres[t]) | set(truth[t])) for t in labeled]
+    return {
+        "coverage": round(len(labeled) / len(truth), 3),
+        "label_iou": round(float(np.mean(ious)), 3) if ious else 0.0,
+        "junk_labeled": sum(1 for g in junk.values() if g),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the embedding and lookup consistency backends.")
+    parser.add_argument("--catalog", type=str, default=str(GREEN_DIR / "data" / "catalog" / "catalog.jsonl"))
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--outputs", type=int, default=20, help="Synthetic outputs per fold")
+    parser.add_argument("--k", type=int, default=5, help="Titles per synthetic output")
+    parser.add_argument("--backends", type=str, default="lookup,embedding")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, default="")
+    args = parser.parse_args()
+
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    with open(GREEN_DIR / "data" / "personas" / "personas.json", "r", encoding="utf-8") as f:
+        personas = json.load(f)
+
+    evaluator = Evaluator(str(GREEN_DIR / "data" / "prompts" / "eval_prompt.txt"), embedding_cache_dir="")
+    entries = [e for e in CatalogIndex.load(args.catalog).entries if e.genres]
+    rng = random.Random(args.seed)
+    rng.shuffle(entries)
+
+    truth: Dict[str, List[str]] = {}
+    predicted: Dict[str, Dict[str, List[str]]] = {b: {} for b in backends}
+    junk: Dict[str, Dict[str, List[str]]] = {}
+    outputs: List[List[str]] = []
+    for fold in range(args.folds):
+        held_out = entries[fold::args.folds]
+        train = [e for i, e in enumerate(entries) if i % args.folds != fold]
+        titles = [e.title for e in held_out]
+        truth.update({e.title: list(e.genres) for e in held_out})
+        outputs += [rng.sample(titles, min(args.k, len(titles))) for _ in range(args.outputs)]
+
+        for backend in backends:
+            if backend == "lookup":
+                classifier = GenreLookup(evaluator.genre_descriptions, CatalogIndex(train)).classifier
+                labels, junk_labels = classifier.predict(titles), classifier.predict(JUNK_TITLES)
+            else:
+                labels, junk_labels = embedding_genres(evaluator, titles), embedding_genres(evaluator, JUNK_TITLES)
+            predicted[backend].update(zip(titles, labels))
+            if fold == 0:
+                junk[backend] = dict(zip(JUNK_TITLES, junk_labels))
+
+    report = {"titles": len(truth), "outputs": len(outputs), "catalog_consistency": round(consistency(evaluator, truth, personas, outputs), 3)}
+    for backend in backends:
+        row = summarize(predicted[backend], truth, junk[backend])
+        row["consistency"] = round(consistency(evaluator, predicted[backend], personas, outputs), 3)
+        row["junk_consistency"] = round(consistency(evaluator, junk[backend], personas, [JUNK_TITLES[i:i + args.k] for i in range(0, len(JUNK_TITLES), args.k)]), 3)
+        report[backend] = row
+
+    print(f"{len(truth)} held-out titles, {len(outputs)} outputs, catalog-genre consistency {report['catalog_consistency']:.3f}")
+    print(f"{'backend':<10} {'coverage':>9} {'label_iou':>10} {'junk':>6} {'consistency':>12} {'junk_cons':>10}")
+    for backend in backends:
+        r = report[backend]
+        print(f"{backend:<10} {r['coverage']:>9.3f} {r['label_iou']:>10.3f} {r['junk_labeled']:>6} {r['consistency']:>12.3f} {r['junk_consistency']:>10.3f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -65,7 +65,7 @@ services:
     environment:{green_env}
     command: ["python", "server.py", "--host", "0.0.0.0", "--port", "{port}", "--card-url", "http://green-agent:{port}"]
     healthcheck:
-      test: ["CMD", "curl", "-f", "http://localhost:{port}/.well-known/agent-card.json"]
+      test: ["CMD", "curl", "-f", "http://localhost:{port}/ready"]
       interval: 5s
       timeout: 3s
       retries: 10
@@ -1,271 +1,515 @@
-import os
-import json
-from dataclasses import dataclass
-from typing import Dict, Any, List
-
-import httpx
-
-from evaluator import Evaluator
-from messenger import Messenger
-from task_generator import TaskGenerator
-
-from a2a.types import Part, DataPart, TextPart
-from a2a.utils import new_agent_text_message
-
-
-
-@dataclass
-class EvalRequest:
-    participants: Dict[str, str]
-    config: Dict[str, Any]
-
-
-
-class GreenA2AAgent:
-    def __init__(self):
-        persona_dir = "data/personas"
-        prompts_dir = "data/prompts"
-
-        self.personas = self._load_personas(persona_dir)
-
-        self.repeat_runs = 3
-        self.llm_temperature = 0.0
-        self.version = "agentbeats-green-v1"
-
-        task_prompt_file = os.path.join(prompts_dir, "task_prompt.txt")
-        eval_prompt_file = os.path.join(prompts_dir, "eval_prompt.txt")
-
-        self.task_generator = TaskGenerator(task_prompt_file)
-        self.evaluator = Evaluator(eval_prompt_file)
-        self.messenger = Messenger()
-
-    # =========================
-    # Persona 加载
-    # =========================
-    def _load_personas(self, persona_dir: str) -> Dict[str, dict]:
-        
-        personas = {}
-
-        if not os.path.exists(persona_dir):
-            os.makedirs(persona_dir, exist_ok=True)
-            return personas
-
-        for file in os.listdir(persona_dir):
-            if not file.endswith(".json"):
-                continue
-
-            path = os.path.join(persona_dir, file)
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-
-                # 如果文件里是 list，就逐个取出
-                if isinstance(data, list):
-                    for p in data:
-                        if not isinstance(p, dict) or "name" not in p:
-                            continue
-                        personas[p["name"]] = p  # 用 persona 中的 name 做 key
-                # 如果文件里是 dict，取 name
-                elif isinstance(data, dict):
-                    if "name" in data:
-                        personas[data["name"]] = data
-
-        return personas
-
-    # =========================
-    # A2A 协议入口
-    # =========================
-    async def run(self, msg, updater):
-        
-
-        
-        if not msg.parts or not msg.parts[0].root:
-            await updater.failed(new_agent_text_message("Empty A2A message"))
-            return
-
-        root = msg.parts[0].root
-        if isinstance(root, TextPart):
-            raw_text = root.text
-        elif isinstance(root, DataPart):
-            raw_text = json.dumps(root.data)
-        else:
-            await updater.failed(new_agent_text_message("Unsupported message part type"))
-            return
-
-        
-        try:
-            payload = json.loads(raw_text)
-        except json.JSONDecodeError:
-            await updater.failed(new_agent_text_message("Message is not valid JSON"))
-            return
-
-        participants = payload.get("participants", {})
-        config = payload.get("config", {})
-
-        purple_url = participants.get("purple_agent")
-        if not purple_url:
-            await updater.failed(new_agent_text_message("Missing participants.purple_agent"))
-            return
-
-        
-        request = EvalRequest(
-            participants={"purple_agent": purple_url},
-            config=config
-        )
-
-        
-        try:
-            # 如果消息里有 persona，则只评估该 persona
-            # 如果没有 persona，则评估所有 persona
-            if "persona" in config:
-                personas_to_run = [config["persona"]]
-            else:
-                personas_to_run = list(self.personas.keys())
-
-            for persona_name in personas_to_run:
-                await self._run_evaluation(request, updater, persona_name)
-
-        except Exception as e:
-            await updater.failed(new_agent_text_message(f"Evaluation failed: {e}"))
-            return
-
-        
-        await updater.complete(new_agent_text_message("Green agent evaluation completed"))
-
-    
-    async def _run_evaluation(self, request: EvalRequest, updater, persona_name: str):
-        
-        task_count = int(request.config.get("task_count", 3))
-        purple_url = request.participants["purple_agent"]
-        persona_name = request.config["persona"]
-        print(persona_name)
-
-        await self.auto_publish_persona_tasks(persona_name, purple_url, updater, task_count)
-
-    
-    async def auto_publish_persona_tasks(self, persona_name: str, purple_url: str, updater=None, task_count: int = 3):
-
-
-        # 取 persona
-
-        persona = self.personas[persona_name]
-
-        print(f"Running evaluation for persona: {persona_name}")
-        tasks = self.task_generator.generate_tasks(persona, task_count=task_count)
-        all_results: List[Dict[str, Any]] = []
-
-        for task in tasks:
-            
-            task["user_history"] = persona.get("history", [])
-            outputs = []
-
-
-            for run_idx in range(self.repeat_runs):
-                try:
-                    reply = await self.messenger.talk_to_agent(
-                        message=json.dumps(task, ensure_ascii=False),
-                        url=purple_url,
-                        new_conversation=(run_idx == 0)
-                    )
-                    text = reply.strip()
-
-                    # 去掉 ``` 和 json 前缀
-                    if text.startswith("```"):
-                        text = text.strip("` \n")
-                    if text.startswith("json"):
-                        text = text[4:].strip()
-
-                    # 如果有多余前缀，去掉
-                    if text.startswith("Prediction completed successfully"):
-                        text = text[len("Prediction completed successfully"):].strip()
-
-                    # 尝试解析 JSON
-                    try:
-                        parsed = json.loads(text)
-                    except json.JSONDecodeError:
-                        parsed = {"raw": text}
-
-                    outputs.append(parsed)
-
-                except Exception as e:
-                    print(f"Purple Agent call failed for task {task.get('task_id')}: {e}")
-
-            if not outputs:
-                print(f"No valid outputs for task {task.get('task_id')}")
-                continue
-
-            last_output = outputs[-1]
-
-            # ---------- 评分 ----------
-            try:
-                structural = self.evaluator.score_structural(task, last_output)
-                semantic = self.evaluator.score_reasoning(task, last_output)
-                consistency = self.evaluator.score_consistency(persona, outputs)
-                explainability = self.evaluator.score_explainability(persona, last_output)
-            except Exception as e:
-                print(f"Scoring failed for task {task.get('task_id')}: {e}")
-                continue
-
-            structural_score = round(
-                0.4 * structural.get("precision", 0.0)
-                + 0.4 * structural.get("recall", 0.0)
-                + 0.2 * structural.get("ndcg", 0.0),
-                4
-            )
-
-            semantic_score = semantic.get("score", 0.0)
-            final_score = round(
-                max(0.0, min(1.0, 0.6 * semantic_score + 0.2 * consistency + 0.2 * explainability)),
-                4
-            )
-
-            task_result = {
-                "task_id": task.get("task_id", "task-unknown"),
-                "instruction": task.get("instruction", ""),
-                "output": last_output,
-                
-                "structural": {
-                    "score": round(structural_score, 4),
-                    "role": "diagnostic_only",
-                    "note": "Heuristic reference metric, not used for scoring"
-                },
-                "semantic": round(semantic_score, 4),
-                "consistency": round(consistency, 4),
-                "explainability": round(explainability, 4),
-                "final_score": final_score,
-            }
-
-            all_results.append(task_result)
-
-
-        if not all_results:
-            print(f"No results generated for persona {persona_name}")
-            return
-
-        persona_score = round(
-            sum(r["final_score"] for r in all_results) / len(all_results),
-            4
-        )
-
-        final_output = {
-            "persona": persona_name,
-            "persona_score": persona_score,
-            "tasks": all_results,
-        }
-
-        # 总结 artifact
-        if updater is not None:
-            await updater.add_artifact(
-                name="GreenAgentSummary",
-                parts=[Part(root=DataPart(data=final_output))]
-            )
-        print("persona_score:", persona_score)
-
-
-        
-        os.makedirs("results", exist_ok=True)
-        output_path = os.path.join("results", f"results_{persona_name}.json")
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(final_output, f, ensure_ascii=False, indent=2)
-
-        print(f"Completed evaluation for persona {persona_name}, saved to {output_path}")
-
+import asyncio
+import os
+import json
+import time
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional
+
+import httpx
+
+from messenger import Messenger
+from metrics import EvaluationTimings, current_timings, inc, span, timed, timed_call
+from progress import PersonaProgress
+from registry import Registry, get_registry
+from task_bank import TASK_BANK_SEED
+from task_store import evaluation_fingerprint, get_checkpoints
+
+from a2a.types import Part, DataPart, TextPart
+from a2a.utils import new_agent_text_message
+
+
+PERSONA_MAX_CONCURRENCY = int(os.getenv("PERSONA_MAX_CONCURRENCY", "5"))
+# single: 每个任务单独评审（eval_prompt.txt，默认）；batch: 一个 persona 的多个任务打包成一次评审请求
+# （batch_eval_prompt.txt，提示词不同，分数不能和 single 直接比较），需显式开启
+JUDGE_MODE = os.getenv("JUDGE_MODE", "single")
+# 单次评估的总时间预算（秒），超时后取消未完成的工作并保留已完成的任务结果；0 表示不限制
+EVAL_TIME_BUDGET = float(os.getenv("EVAL_TIME_BUDGET", "1800"))
+# 每个任务评分后写入 SQLite 检查点；同一 context 重新提交时从检查点继续
+GREEN_CHECKPOINTS = os.getenv("GREEN_CHECKPOINTS", "1").lower() in ("1", "true", "yes")
+
+
+@dataclass
+class EvalRequest:
+    participants: Dict[str, str]
+    config: Dict[str, Any]
+    deadline: Optional[float] = None  # time.monotonic() 时间点
+    context_id: Optional[str] = None
+
+
+
+class GreenA2AAgent:
+    def __init__(self, registry: Optional[Registry] = None):
+        # 模型、persona、prompt 都来自进程级共享的 registry，单个 agent 只持有会话状态
+        registry = registry or get_registry()
+
+        self.personas = registry.personas
+
+        self.repeat_runs = 3
+        self.judge_mode = JUDGE_MODE
+        self.llm_temperature = 0.0
+        self.version = "agentbeats-green-v1"
+
+        self.task_generator = registry.task_generator
+        self.task_bank = registry.task_bank
+        self.evaluator = registry.evaluator
+        self.messenger = Messenger()
+
+    # =========================
+    # A2A 协议入口
+    # =========================
+    async def run(self, msg, updater):
+        
+
+        
+        if not msg.parts or not msg.parts[0].root:
+            await updater.failed(new_agent_text_message("Empty A2A message"))
+            return
+
+        root = msg.parts[0].root
+        if isinstance(root, TextPart):
+            raw_text = root.text
+        elif isinstance(root, DataPart):
+            raw_text = json.dumps(root.data)
+        else:
+            await updater.failed(new_agent_text_message("Unsupported message part type"))
+            return
+
+        
+        try:
+            payload = json.loads(raw_text)
+        except json.JSONDecodeError:
+            await updater.failed(new_agent_text_message("Message is not valid JSON"))
+            return
+
+        participants = payload.get("participants", {})
+        config = payload.get("config", {})
+
+        purple_url = participants.get("purple_agent")
+        if not purple_url:
+            await updater.failed(new_agent_text_message("Missing participants.purple_agent"))
+            return
+
+        
+        budget = float(config.get("time_budget", EVAL_TIME_BUDGET))
+        request = EvalRequest(
+            participants={"purple_agent": purple_url},
+            config=config,
+            deadline=time.monotonic() + budget if budget > 0 else None,
+            context_id=getattr(updater, "context_id", None) or msg.context_id,
+        )
+
+        
+        try:
+            # 如果消息里有 persona，则只评估该 persona
+            # 如果没有 persona，则并发评估所有 persona，最后输出排行榜
+            if "persona" in config:
+                await self._run_evaluation(request, updater, config["persona"])
+            else:
+                await self._run_all_personas(request, updater)
+
+        except Exception as e:
+            await updater.failed(new_agent_text_message(f"Evaluation failed: {e}"))
+            return
+
+        
+        await updater.complete(new_agent_text_message("Green agent evaluation completed"))
+
+    
+    async def _run_evaluation(self, request: EvalRequest, updater, persona_name: str) -> Optional[Dict[str, Any]]:
+        
+        task_count = int(request.config.get("task_count", 3))
+        purple_url = request.participants["purple_agent"]
+        print(persona_name)
+
+        judge_mode = request.config.get("judge_mode", self.judge_mode)
+        seed = request.config.get("seed")
+
+        return await self.auto_publish_persona_tasks(
+            persona_name, purple_url, updater, task_count, judge_mode, deadline=request.deadline,
+            seed=int(seed) if seed is not None else None, context_id=request.context_id
+        )
+
+    async def _run_all_personas(self, request: EvalRequest, updater):
+
+        limit = int(request.config.get("persona_concurrency", PERSONA_MAX_CONCURRENCY))
+        semaphore = asyncio.Semaphore(max(1, limit))
+
+        async def run_one(persona_name: str):
+            async with semaphore:
+                return await self._run_evaluation(request, updater, persona_name)
+
+        # 每个 persona 完成时各自输出 GreenAgentSummary，单个 persona 失败不影响其它 persona
+        persona_names = list(self.personas.keys())
+        outcomes = await asyncio.gather(
+            *(run_one(name) for name in persona_names),
+            return_exceptions=True
+        )
+
+        summaries = []
+        for name, outcome in zip(persona_names, outcomes):
+            # CancelledError 是 BaseException：取消要继续向上传播，不能当成某个 persona 的失败
+            if isinstance(outcome, asyncio.CancelledError):
+                raise outcome
+            if isinstance(outcome, BaseException):
+                print(f"Evaluation failed for persona {name}: {outcome}")
+            elif outcome:
+                summaries.append(outcome)
+
+        leaderboard = self._build_leaderboard(summaries)
+
+        # 排行榜 artifact
+        if updater is not None:
+            with span("artifact_emit"):
+                await updater.add_artifact(
+                    name="GreenAgentLeaderboard",
+                    parts=[Part(root=DataPart(data=leaderboard))]
+                )
+
+        os.makedirs("results", exist_ok=True)
+        output_path = os.path.join("results", "leaderboard.json")
+        with span("result_write"), open(output_path, "w", encoding="utf-8") as f:
+            json.dump(leaderboard, f, ensure_ascii=False, indent=2)
+
+        print(f"Completed evaluation for {len(summaries)} personas, saved to {output_path}")
+
+    @staticmethod
+    def _build_leaderboard(summaries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        ranked = sorted(summaries, key=lambda s: (-s["persona_score"], s["persona"]))
+        entries = [
+            {
+                "rank": i + 1,
+                "persona": s["persona"],
+                "persona_score": s["persona_score"],
+                "task_count": len(s["tasks"]),
+            }
+            for i, s in enumerate(ranked)
+        ]
+        overall_score = round(
+            sum(s["persona_score"] for s in summaries) / len(summaries), 4
+        ) if summaries else 0.0
+
+        return {
+            "overall_score": overall_score,
+            "persona_count": len(entries),
+            "personas": entries,
+        }
+
+    
+    async def auto_publish_persona_tasks(self, persona_name: str, purple_url: str, updater=None, task_count: int = 3, judge_mode: Optional[str] = None, deadline: Optional[float] = None, seed: Optional[int] = None, context_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+
+
+        # 取 persona
+
+        persona = self.personas[persona_name]
+
+        # 本次 persona 评估的分阶段耗时，写入结果 JSON 的 timing 字段
+        timings = EvaluationTimings()
+        token = current_timings.set(timings)
+        try:
+            return await self._publish_persona_tasks(persona_name, persona, purple_url, updater, task_count, judge_mode, deadline, timings, seed, context_id)
+        finally:
+            current_timings.reset(token)
+
+    async def _publish_persona_tasks(
+        self,
+        persona_name: str,
+        persona: Dict[str, Any],
+        purple_url: str,
+        updater,
+        task_count: int,
+        judge_mode: Optional[str],
+        deadline: Optional[float],
+        timings: EvaluationTimings,
+        seed: Optional[int] = None,
+        context_id: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+
+        print(f"Running evaluation for persona: {persona_name}")
+        judge_mode = judge_mode or self.judge_mode
+        # 检查点的 SQLite 读写都放到线程里，不阻塞事件循环
+        checkpoints = await asyncio.to_thread(get_checkpoints) if GREEN_CHECKPOINTS and context_id else None
+        # 检查点只对同样的 purple / 评审模式 / 任务数 / seed 有效
+        fingerprint = evaluation_fingerprint(purple_url, judge_mode, task_count, seed)
+        stored = await asyncio.to_thread(checkpoints.load_tasks, context_id, persona_name, fingerprint) if checkpoints else None
+
+        completed: Dict[int, Dict[str, Any]] = {}
+        if stored is not None:
+            # 同一 context、同样配置重新提交（上次被中断）：沿用上次的任务列表，跳过已评分的任务
+            tasks, task_source = stored
+            completed = await asyncio.to_thread(checkpoints.load_results, context_id, persona_name)
+            print(f"Resuming persona {persona_name} from checkpoint: {len(completed)}/{len(tasks)} tasks already scored")
+        else:
+            try:
+                tasks, task_source = await asyncio.wait_for(
+                    self._load_tasks(persona_name, persona, task_count, seed),
+                    timeout=self._remaining(deadline)
+                )
+            except asyncio.TimeoutError:
+                print(f"Time budget exhausted before tasks were generated for persona {persona_name}")
+                return None
+            if checkpoints:
+                await asyncio.to_thread(checkpoints.save_tasks, context_id, persona_name, tasks, task_source, fingerprint)
+
+        progress = PersonaProgress(
+            persona_name, len(tasks), updater,
+            checkpoint=(lambda i, r: asyncio.to_thread(checkpoints.save_result, context_id, persona_name, i, r)) if checkpoints else None,
+        )
+        progress.restore(completed)
+        pending = [i for i in range(len(tasks)) if i not in completed]
+
+        if judge_mode == "batch":
+            work = self._evaluate_tasks_batched(persona, tasks, purple_url, progress, pending)
+        else:
+            work = self._evaluate_tasks(persona, tasks, purple_url, progress, pending)
+
+        # 超出时间预算时取消未完成的 purple / 评审调用，已评分的任务保留在 spool 里
+        partial = False
+        try:
+            try:
+                await asyncio.wait_for(work, timeout=self._remaining(deadline))
+            except asyncio.TimeoutError:
+                partial = True
+                print(f"Time budget exhausted for persona {persona_name}, keeping {progress.scored}/{len(tasks)} scored tasks")
+
+            # summary 由已推送的任务结果重建，按任务顺序排列
+            all_results: List[Dict[str, Any]] = progress.results()
+        finally:
+            # 其它异常（或取消）也要删掉 spool 文件
+            progress.cleanup()
+
+
+        if not all_results:
+            print(f"No results generated for persona {persona_name}")
+            return None
+
+        persona_score = round(
+            sum(r["final_score"] for r in all_results) / len(all_results),
+            4
+        )
+
+        final_output = {
+            "persona": persona_name,
+            "persona_score": persona_score,
+            "task_source": task_source,
+            "judge_mode": judge_mode,
+            "tasks": all_results,
+        }
+        if partial:
+            final_output["partial"] = True
+        if completed:
+            final_output["resumed_tasks"] = len(completed)
+        final_output["timing"] = timings.summary()
+
+        # 总结 artifact
+        if updater is not None:
+            with span("artifact_emit"):
+                await updater.add_artifact(
+                    name="GreenAgentSummary",
+                    parts=[Part(root=DataPart(data=final_output))]
+                )
+        print("persona_score:", persona_score)
+
+
+        
+        os.makedirs("results", exist_ok=True)
+        output_path = os.path.join("results", f"results_{persona_name}.json")
+        with span("result_write"), open(output_path, "w", encoding="utf-8") as f:
+            json.dump(final_output, f, ensure_ascii=False, indent=2)
+
+        # 所有任务都已评分的评估不再续跑；被时间预算截断或有任务失败的保留检查点
+        if checkpoints and not partial and progress.scored == len(tasks):
+            await asyncio.to_thread(checkpoints.clear, context_id, persona_name)
+
+        print(f"Completed evaluation for persona {persona_name}, saved to {output_path}")
+
+        return final_output
+
+    async def _load_tasks(self, persona_name: str, persona: Dict[str, Any], task_count: int, seed: Optional[int]):
+        """
+        Sample tasks from the offline bank; live LLM generation only when the bank has no match.
+        """
+        if self.task_bank:
+            seed = TASK_BANK_SEED if seed is None else seed
+            with span("task_bank"):
+                tasks = self.task_bank.sample(persona_name, persona, task_count, seed)
+            if tasks is not None:
+                inc("green_task_bank_total", help="Task bank lookups", outcome="hit")
+                return tasks, {"type": "bank", "version": self.task_bank.version, "seed": seed}
+            inc("green_task_bank_total", help="Task bank lookups", outcome="miss")
+
+        tasks = await timed("task_generation", self.task_generator.generate_tasks(persona, task_count=task_count))
+        return tasks, {"type": "live"}
+
+    @staticmethod
+    def _remaining(deadline: Optional[float]) -> Optional[float]:
+        if deadline is None:
+            return None
+        return max(0.0, deadline - time.monotonic())
+
+    async def _evaluate_tasks(self, persona: Dict[str, Any], tasks: List[Dict[str, Any]], purple_url: str, progress: PersonaProgress, pending: Optional[List[int]] = None):
+
+        async def evaluate_and_stream(index: int, task: Dict[str, Any]):
+            result = await self._evaluate_task(persona, task, purple_url)
+            # 每个任务评分完成后立即推送进度（含 running average 和 ETA）
+            await progress.record(index, result)
+
+        # 任务之间互不依赖，并发执行；并发度由 purple 端点和 LLM 后端的信号量限制
+        await asyncio.gather(
+            *(evaluate_and_stream(i, tasks[i]) for i in (pending if pending is not None else range(len(tasks))))
+        )
+
+    async def _evaluate_tasks_batched(self, persona: Dict[str, Any], tasks: List[Dict[str, Any]], purple_url: str, progress: PersonaProgress, pending: Optional[List[int]] = None):
+
+        indices = pending if pending is not None else list(range(len(tasks)))
+
+        # purple 调用仍按任务并发；全部返回后把所有 (task, output) 打包评审
+        outputs_list = await asyncio.gather(
+            *(self._collect_outputs(persona, tasks[i], purple_url) for i in indices)
+        )
+        collected = dict(zip(indices, outputs_list))
+
+        ready = []
+        for i, outputs in collected.items():
+            if outputs:
+                ready.append(i)
+            else:
+                await progress.record(i, None)
+
+        try:
+            judged = await timed("score_judge_batch", self.evaluator.score_batch(
+                persona, [(tasks[i], collected[i][-1]) for i in ready]
+            ))
+        except Exception as e:
+            print(f"Batched judging failed for persona {persona.get('name')}: {e}")
+            judged = [None] * len(ready)
+
+        async def score_and_stream(index: int, judgement: Optional[Dict[str, Any]]):
+            result = await self._score_task(persona, tasks[index], collected[index], judgement)
+            await progress.record(index, result)
+
+        await asyncio.gather(
+            *(score_and_stream(i, j) for i, j in zip(ready, judged))
+        )
+
+    async def _evaluate_task(self, persona: Dict[str, Any], task: Dict[str, Any], purple_url: str) -> Optional[Dict[str, Any]]:
+
+        outputs = await self._collect_outputs(persona, task, purple_url)
+        if not outputs:
+            return None
+
+        return await self._score_task(persona, task, outputs)
+
+    async def _collect_outputs(self, persona: Dict[str, Any], task: Dict[str, Any], purple_url: str) -> List[Dict[str, Any]]:
+
+        task["user_history"] = persona.get("history", [])
+
+        # 每次重复运行都是独立会话，可以并发发送
+        runs = await asyncio.gather(
+            *(self._call_purple(task, purple_url) for _ in range(self.repeat_runs))
+        )
+        outputs = [o for o in runs if o is not None]
+
+        if not outputs:
+            print(f"No valid outputs for task {task.get('task_id')}")
+
+        return outputs
+
+    async def _score_task(
+        self,
+        persona: Dict[str, Any],
+        task: Dict[str, Any],
+        outputs: List[Dict[str, Any]],
+        judgement: Optional[Dict[str, Any]] = None,
+    ) -> Optional[Dict[str, Any]]:
+
+        last_output = outputs[-1]
+
+        # ---------- 评分 ----------
+        # 四个评分维度互不依赖：LLM 评分并发等待，embedding 计算放到线程里避免阻塞事件循环
+        # 已有批量评审结果时只需计算本地指标
+        try:
+            structural = timed_call("score_structural", self.evaluator.score_structural, task, last_output)
+            if judgement is None:
+                semantic, consistency, explainability = await asyncio.gather(
+                    timed("score_semantic", self.evaluator.score_reasoning(task, last_output)),
+                    asyncio.to_thread(timed_call, "score_consistency", self.evaluator.score_consistency, persona, outputs),
+                    timed("score_explainability", self.evaluator.score_explainability(persona, last_output)),
+                )
+            else:
+                consistency = await asyncio.to_thread(timed_call, "score_consistency", self.evaluator.score_consistency, persona, outputs)
+                semantic, explainability = judgement["semantic"], judgement["explainability"]
+        except Exception as e:
+            print(f"Scoring failed for task {task.get('task_id')}: {e}")
+            return None
+
+        structural_score = round(
+            0.4 * structural.get("precision", 0.0)
+            + 0.4 * structural.get("recall", 0.0)
+            + 0.2 * structural.get("ndcg", 0.0),
+            4
+        )
+
+        semantic_score = semantic.get("score", 0.0)
+        final_score = round(
+            max(0.0, min(1.0, 0.6 * semantic_score + 0.2 * consistency + 0.2 * explainability)),
+            4
+        )
+
+        return {
+            "task_id": task.get("task_id", "task-unknown"),
+            "instruction": task.get("instruction", ""),
+            "output": last_output,
+            
+            "structural": {
+                "score": round(structural_score, 4),
+                "role": "diagnostic_only",
+                "note": "Heuristic reference metric, not used for scoring"
+            },
+            "semantic": round(semantic_score, 4),
+            "consistency": round(consistency, 4),
+            "explainability": round(explainability, 4),
+            "final_score": final_score,
+        }
+
+    async def _call_purple(self, task: Dict[str, Any], purple_url: str) -> Optional[Dict[str, Any]]:
+        try:
+            # 任务以 DataPart 发送，prediction artifact 直接以 dict 返回；支持批量的 purple 会被合并发送
+            outputs = await timed("purple_call", self.messenger.send_task(task, purple_url))
+        except Exception as e:
+            print(f"Purple Agent call failed for task {task.get('task_id')}: {e}")
+            return None
+
+        return self._extract_prediction(outputs)
+
+    @classmethod
+    def _extract_prediction(cls, outputs: Dict[str, Any]) -> Dict[str, Any]:
+        for data in outputs.get("data", []):
+            if isinstance(data, dict) and "prediction" in data:
+                return data
+
+        # 兼容只返回文本的 purple agent
+        for text in outputs.get("text", []):
+            parsed = cls._parse_reply(text)
+            if isinstance(parsed, dict) and "prediction" in parsed:
+                return parsed
+        return cls._parse_reply("\n".join(outputs.get("text", [])))
+
+    @staticmethod
+    def _parse_reply(reply: str) -> Dict[str, Any]:
+        text = reply.strip()
+
+        # 去掉 ``` 和 json 前缀
+        if text.startswith("```"):
+            text = text.strip("` \n")
+        if text.startswith("json"):
+            text = text[4:].strip()
+
+        # 如果有多余前缀，去掉
+        if text.startswith("Prediction completed successfully"):
+            text = text[len("Prediction completed successfully"):].strip()
+
+        # 尝试解析 JSON
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            return {"raw": text}
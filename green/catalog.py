@@ -0,0 +1,168 @@
+# agentbeats/green/catalog.py
+"""
+In-memory title catalog: normalized titles and aliases -> id, year, genres.
+
+The catalog is a JSONL file (``data/catalog/catalog.jsonl``), one entry per line::
+
+    {"id": "se7en-1995", "title": "Se7en", "year": 1995, "genres": ["Drama", "Thriller"], "aliases": ["Seven"]}
+
+``id`` and ``aliases`` are optional. The file is read once per process; lookups are
+a dict hit on the folded title, then on the title with a trailing ``(year)`` removed,
+then (optionally) a character-trigram fuzzy match for typos and punctuation variants.
+"""
+
+import json
+import os
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from scoring_rules import fold_title
+
+CATALOG_PATH = os.getenv("CATALOG_PATH", "data/catalog/catalog.jsonl")
+CATALOG_FUZZY_THRESHOLD = float(os.getenv("CATALOG_FUZZY_THRESHOLD", "0.8"))
+
+_YEAR_SUFFIX_RE = re.compile(r"\s*[\(\[]?\b(18|19|20)\d{2}\b[\)\]]?\s*$")
+
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    id: str
+    title: str
+    year: Optional[int]
+    genres: Tuple[str, ...]
+    aliases: Tuple[str, ...] = ()
+
+
+def _trigrams(key: str) -> List[str]:
+    padded = f"  {key} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+class CatalogIndex:
+    """
+    Exact (title / alias / title+year) hash index plus a trigram posting index for fuzzy lookups.
+    """
+
+    def __init__(self, entries: List[CatalogEntry], fuzzy_threshold: float = CATALOG_FUZZY_THRESHOLD):
+        self.entries = entries
+        self.fuzzy_threshold = fuzzy_threshold
+        self.by_id: Dict[str, CatalogEntry] = {e.id: e for e in entries}
+
+        # folded key -> entry 下标；同名不同年份时只有 "title year" 形式是唯一的
+        self._exact: Dict[str, int] = {}
+        self._keys: List[str] = []
+        self._key_owner: List[int] = []
+        for i, entry in enumerate(entries):
+            for name in (entry.title,) + entry.aliases:
+                key = fold_title(name)
+                if not key:
+                    continue
+                self._exact.setdefault(key, i)
+                if entry.year:
+                    self._exact.setdefault(f"{key} {entry.year}", i)
+                self._keys.append(key)
+                self._key_owner.append(i)
+
+        self._postings: Dict[str, List[int]] = {}
+        self._key_sizes: List[int] = []
+        for k, key in enumerate(self._keys):
+            grams = set(_trigrams(key))
+            self._key_sizes.append(len(grams))
+            for g in grams:
+                self._postings.setdefault(g, []).append(k)
+
+        self._cached_lookup = lru_cache(maxsize=65536)(self._lookup)
+
+    @classmethod
+    def load(cls, path: str = CATALOG_PATH) -> "CatalogIndex":
+        entries: List[CatalogEntry] = []
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    obj = json.loads(line)
+                    title = obj.get("title", "")
+                    if not title:
+                        continue
+                    year = obj.get("year")
+                    entries.append(CatalogEntry(
+                        id=str(obj.get("id") or "-".join(filter(None, [fold_title(title).replace(" ", "-"), str(year or "")]))),
+                        title=title,
+                        year=int(year) if year else None,
+                        genres=tuple(obj.get("genres", [])),
+                        aliases=tuple(obj.get("aliases", [])),
+                    ))
+        return cls(entries)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _fuzzy(self, key: str) -> Optional[int]:
+        grams = set(_trigrams(key))
+        if not grams:
+            return None
+        shared = Counter(k for g in grams for k in self._postings.get(g, ()))
+        best, best_score = None, self.fuzzy_threshold
+        for k, n in shared.items():
+            # Dice coefficient over trigram sets
+            score = 2.0 * n / (len(grams) + self._key_sizes[k])
+            if score >= best_score:
+                best, best_score = self._key_owner[k], score
+        return best
+
+    def _lookup(self, title: str, fuzzy: bool) -> Optional[CatalogEntry]:
+        key = fold_title(title)
+        if not key:
+            return None
+        i = self._exact.get(key)
+        if i is None:
+            stripped = fold_title(_YEAR_SUFFIX_RE.sub("", str(title)))
+            if stripped and stripped != key:
+                i = self._exact.get(stripped)
+        if i is None and fuzzy:
+            i = self._fuzzy(key)
+        return self.entries[i] if i is not None else None
+
+    def lookup(self, title, fuzzy: bool = True) -> Optional[CatalogEntry]:
+        if isinstance(title, dict):
+            title = title.get("title", "")
+        return self._cached_lookup(str(title), fuzzy)
+
+    def match_key(self, title) -> str:
+        """
+        Identity key for ranking matches: the catalog id when the title (or an alias) is known,
+        the folded title otherwise. Fuzzy matching is off here so sequels never collapse.
+        """
+        entry = self.lookup(title, fuzzy=False)
+        return f"id:{entry.id}" if entry is not None else fold_title(title)
+
+    def genres_batch(self, titles: List[str], fuzzy: bool = True) -> List[Optional[List[str]]]:
+        """
+        Catalog genres per title, ``None`` for titles the catalog does not know.
+        """
+        out = []
+        for t in titles:
+            entry = self.lookup(t, fuzzy)
+            out.append(list(entry.genres) if entry is not None and entry.genres else None)
+        return out
+
+
+_catalogs: Dict[str, CatalogIndex] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(path: str = CATALOG_PATH) -> CatalogIndex:
+    catalog = _catalogs.get(path)
+    if catalog is None:
+        with _catalogs_lock:
+            catalog = _catalogs.get(path)
+            if catalog is None:
+                catalog = CatalogIndex.load(path)
+                _catalogs[path] = catalog
+    return catalog
@@ -0,0 +1,71 @@
+# agentbeats/green/embedder.py
+"""
+Lazy loader for the sentence-embedding model used by consistency scoring.
+
+``sentence_transformers`` (and torch behind it) is imported only when the model is
+first needed, so importing the evaluator — and binding the server port — stays cheap.
+
+EMBEDDING_BACKEND selects the runtime:
+  * ``torch``          - default SentenceTransformer on PyTorch;
+  * ``onnx``           - ONNX Runtime on CPU (needs ``sentence-transformers[onnx]``);
+  * ``onnx-quantized`` - ONNX Runtime with the int8-quantized weights shipped in the model repo.
+
+Run ``python embedder.py`` at image build time to download the weights into the cache
+(SENTENCE_TRANSFORMERS_HOME / HF_HOME) so containers start without network access.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Optional
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+EMBEDDING_ONNX_QUANTIZED_FILE = os.getenv("EMBEDDING_ONNX_QUANTIZED_FILE", "onnx/model_qint8_avx2.onnx")
+
+_models: dict = {}
+_models_lock = threading.Lock()
+
+
+def load_model(model_name: str = EMBEDDING_MODEL, backend: str = EMBEDDING_BACKEND) -> Any:
+    """
+    Build (once per process) the SentenceTransformer for ``model_name`` on ``backend``.
+    """
+    key = (model_name, backend)
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _models_lock:
+        model = _models.get(key)
+        if model is None:
+            start = time.perf_counter()
+            # 延迟导入：torch / transformers 的导入本身就要数秒
+            from sentence_transformers import SentenceTransformer
+
+            if backend == "torch":
+                model = SentenceTransformer(model_name)
+            elif backend == "onnx":
+                model = SentenceTransformer(model_name, backend="onnx")
+            elif backend == "onnx-quantized":
+                model = SentenceTransformer(
+                    model_name,
+                    backend="onnx",
+                    model_kwargs={"file_name": EMBEDDING_ONNX_QUANTIZED_FILE},
+                )
+            else:
+                raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend}")
+
+            print(f"Loaded embedding model {model_name} ({backend}) in {time.perf_counter() - start:.2f}s")
+            _models[key] = model
+    return model
+
+
+def loaded_model(model_name: str = EMBEDDING_MODEL, backend: str = EMBEDDING_BACKEND) -> Optional[Any]:
+    return _models.get((model_name, backend))
+
+
+if __name__ == "__main__":
+    # 构建镜像时预下载权重，并跑一次 encode 确认后端可用
+    model = load_model()
+    model.encode(["warmup"], convert_to_numpy=True)
@@ -0,0 +1,146 @@
+# agentbeats/green/embedding_store.py
+
+import os
+import re
+import threading
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX 平台没有文件锁，只保证单进程安全
+    fcntl = None
+
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "cache/embeddings")
+
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_title(title: str) -> str:
+    return _WS_RE.sub(" ", str(title)).strip().casefold()
+
+
+class EmbeddingStore:
+    """
+    Append-only title -> embedding store on local disk.
+
+    Layout inside ``path``:
+      vectors.f32  raw float32 rows, memory-mapped read-only
+      titles.txt   one normalized title per line; line number == row number
+
+    Writers append under an exclusive file lock (vectors first, then titles),
+    so any process can map the same files and pick up rows appended by others.
+    """
+
+    def __init__(self, path: str, dim: int):
+        self.path = path
+        self.dim = dim
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._titles_path = os.path.join(path, "titles.txt")
+        self._lock_path = os.path.join(path, ".lock")
+
+        self._index: Dict[str, int] = {}
+        self._titles_offset = 0
+        self._matrix: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+
+    @property
+    def _row_bytes(self) -> int:
+        return self.dim * 4
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    # =========================
+    # 读取：增量加载其它进程追加的行
+    # =========================
+    def _refresh(self):
+        try:
+            size = os.path.getsize(self._titles_path)
+        except OSError:
+            return
+        if size == self._titles_offset:
+            return
+
+        with open(self._titles_path, "rb") as f:
+            f.seek(self._titles_offset)
+            chunk = f.read(size - self._titles_offset)
+
+        # 只处理完整的行，半行留给下次
+        end = chunk.rfind(b"\n") + 1
+        if end == 0:
+            return
+
+        row = len(self._index)
+        for line in chunk[:end].decode("utf-8").split("\n")[:-1]:
+            self._index.setdefault(line, row)
+            row += 1
+        self._titles_offset += end
+
+        rows = os.path.getsize(self._vectors_path) // self._row_bytes
+        self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+
+    def lookup(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        with self._lock:
+            self._refresh()
+            return {
+                k: self._matrix[self._index[k]]
+                for k in keys
+                if k in self._index
+            }
+
+    # =========================
+    # 写入：加文件锁追加
+    # =========================
+    def append(self, keys: List[str], vectors: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        os.makedirs(self.path, exist_ok=True)
+
+        with self._lock, open(self._lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+
+                fresh = {}
+                for key, vec in zip(keys, vectors):
+                    if key not in self._index and key not in fresh:
+                        fresh[key] = vec
+                if not fresh:
+                    return
+
+                # 丢弃上次写入中断留下的孤立向量行，保证行号与标题一一对应
+                rows = len(self._index)
+                with open(self._vectors_path, "ab") as f:
+                    f.truncate(rows * self._row_bytes)
+                    f.write(np.stack(list(fresh.values())).tobytes())
+                with open(self._titles_path, "a", encoding="utf-8", newline="\n") as f:
+                    f.write("".join(k + "\n" for k in fresh))
+
+                self._refresh()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def encode(self, titles: List[str], encoder: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        Return a (N, dim) matrix for ``titles``; only titles never seen before go through ``encoder``.
+        """
+        keys = [normalize_title(t) for t in titles]
+        found = self.lookup(keys)
+
+        missing: Dict[str, str] = {}
+        for key, title in zip(keys, titles):
+            if key not in found and key not in missing:
+                missing[key] = str(title)
+
+        if missing:
+            vectors = np.asarray(encoder(list(missing.values())), dtype=np.float32)
+            self.append(list(missing.keys()), vectors)
+            found.update(zip(missing.keys(), vectors))
+
+        out = np.empty((len(titles), self.dim), dtype=np.float32)
+        for i, key in enumerate(keys):
+            out[i] = found[key]
+        return out
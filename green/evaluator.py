@@ -1,157 +1,411 @@
-# agentbeats/green/evaluator.py
-
-import json
-from typing import Dict, Any, List
-from llm import deepseek_chat
-from scoring_rules import precision_at_k, recall_at_k, ndcg_at_k
-from sentence_transformers import SentenceTransformer
-import numpy as np
-
-
-class Evaluator:
-    def __init__(self, eval_prompt_path: str, genre_descriptions: Dict[str, str] = None):
-        with open(eval_prompt_path, "r", encoding="utf-8") as f:
-            self.eval_prompt = f.read()
-
-        # ====== For enhanced consistency scoring ======
-        self.genre_descriptions = genre_descriptions or {
-            "Action": "action, fight, war, mission, killer",
-            "Thriller": "thrill, crime, murder, dark, detective",
-            "Drama": "life, family, love, story",
-            "Comedy": "fun, comedy, funny",
-            "Romance": "love, romance, relationship"
-        }
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
-        # precompute genre embeddings
-        self.genre_embeddings = {
-            genre: self.model.encode(desc, convert_to_numpy=True)
-            for genre, desc in self.genre_descriptions.items()
-        }
-
-    # ==================================================
-    # ① LLM Semantic Reasoning
-    # ==================================================
-    def score_reasoning(self, task: Dict[str, Any], output: Dict[str, Any]) -> Dict[str, Any]:
-        prompt = (
-            self.eval_prompt
-            .replace("<<task>>", json.dumps(task, ensure_ascii=False))
-            .replace("<<output>>", json.dumps(output, ensure_ascii=False))
-        )
-
-        raw = deepseek_chat(
-            messages=[
-                {"role": "system", "content": "You are a strict AI evaluator. Only output JSON {score, reason}"},
-                {"role": "user", "content": prompt}
-            ],
-            model="deepseek-chat",
-            temperature=0
-        )
-
-        try:
-            obj = json.loads(raw)
-            score = float(obj.get("score", 0))
-            reason = obj.get("reason", "")
-            score = max(0.0, min(1.0, score))
-            return {"score": score, "reason": reason}
-        except Exception:
-            return {"score": 0.0, "reason": f"Parsing failed: {raw}"}
-
-    # ==================================================
-    # ② Behavioral Consistency
-    # ==================================================
-    def infer_genres(self, movie_name: str, threshold: float = 0.3) -> List[str]:
-        """
-        Use embedding similarity to infer movie genres.
-        """
-        movie_emb = self.model.encode(movie_name, convert_to_numpy=True)
-        inferred = []
-        for genre, emb in self.genre_embeddings.items():
-            sim = np.dot(movie_emb, emb) / (np.linalg.norm(movie_emb) * np.linalg.norm(emb))
-            if sim >= threshold:
-                inferred.append(genre)
-        return inferred
-
-    def score_consistency(self, persona: Dict[str, Any], outputs: List[Dict[str, Any]]) -> float:
-        prefs = set(persona.get("preferences", []))
-        if not prefs or not outputs:
-            return 0.0
-
-        scores = []
-        for out in outputs:
-            preds = out.get("prediction", [])
-            if not preds:
-                scores.append(0.0)
-                continue
-
-            match_scores = []
-            for m in preds:
-                genres = set(self.infer_genres(str(m)))
-                if not genres:
-                    continue
-                # multi-label intersection-over-union score
-                score = len(genres & prefs) / len(genres | prefs)
-                match_scores.append(score)
-
-            scores.append(np.mean(match_scores) if match_scores else 0.0)
-
-        return float(np.mean(scores)) if scores else 0.0
-
-    # ==================================================
-    # ③ Explainability
-    # ==================================================
-    def score_explainability(self, persona: Dict[str, Any], output: Dict[str, Any]) -> float:
-        explanation = output.get("explanation", "")
-        if not explanation:
-            return 0.0
-
-        prompt = f"""
-Persona:
-{json.dumps(persona, ensure_ascii=False)}
-
-Explanation:
-{explanation}
-
-Rate from 0 to 1 whether the explanation:
-- References key persona info
-- Reasonably supports final decision
-- Avoids empty templating
-Only output a single number.
-"""
-
-        raw = deepseek_chat(
-            messages=[
-                {"role": "system", "content": "You are an explanation evaluator. Only output a number"},
-                {"role": "user", "content": prompt}
-            ],
-            model="deepseek-chat",
-            temperature=0
-        )
-
-        try:
-            return max(0.0, min(1.0, float(raw.strip())))
-        except Exception:
-            return 0.0
-
-    # ==================================================
-    # ④ Structural metrics
-    # ==================================================
-    def score_structural(self, task: Dict[str, Any], output: Dict[str, Any]) -> Dict[str, float]:
-        truth = []
-        for x in task.get("ground_truth", []):
-            if isinstance(x, dict):
-                truth.append(x.get("title", ""))
-            elif isinstance(x, str):
-                truth.append(x)
-
-        pred = output.get("prediction", [])
-        if isinstance(pred, str):
-            pred = [pred]
-
-        if not truth or not pred:
-            return {"precision": 0.0, "recall": 0.0, "ndcg": 0.0}
-
-        return {
-            "precision": precision_at_k(pred, truth, k=5),
-            "recall": recall_at_k(pred, truth, k=5),
-            "ndcg": ndcg_at_k(pred, truth, k=5)
-        }
+# agentbeats/green/evaluator.py
+
+import asyncio
+import json
+import os
+import threading
+from typing import Dict, Any, List, Optional
+from llm import deepseek_chat
+from embedding_store import EMBEDDING_CACHE_DIR, EmbeddingStore
+from embedder import EMBEDDING_BACKEND, EMBEDDING_MODEL, load_model
+from catalog import CATALOG_PATH, CatalogIndex, get_catalog
+from genre_lookup import GenreLookup
+from scoring_rules import ranking_metrics
+import numpy as np
+
+
+JUDGE_BATCH_SIZE = int(os.getenv("JUDGE_BATCH_SIZE", "8"))
+# embedding: SentenceTransformer 相似度；lookup: 目录查表 + NumPy 哈希分类器，不加载模型
+CONSISTENCY_BACKEND = os.getenv("CONSISTENCY_BACKEND", "embedding").lower()
+# embedding 后端默认只用模型推断，保持原有评分；打开后目录里精确命中的标题直接用目录 genre
+CONSISTENCY_CATALOG_GENRES = os.getenv("CONSISTENCY_CATALOG_GENRES", "").lower() in ("1", "true", "yes")
+
+
+class Evaluator:
+    def __init__(
+        self,
+        eval_prompt_path: str,
+        genre_descriptions: Dict[str, str] = None,
+        embedding_cache_dir: str = EMBEDDING_CACHE_DIR,
+        batch_eval_prompt_path: Optional[str] = None,
+        consistency_backend: str = CONSISTENCY_BACKEND,
+        catalog_path: str = CATALOG_PATH,
+        catalog_genres: bool = CONSISTENCY_CATALOG_GENRES,
+    ):
+        with open(eval_prompt_path, "r", encoding="utf-8") as f:
+            self.eval_prompt = f.read()
+
+        self.batch_eval_prompt = None
+        if batch_eval_prompt_path:
+            with open(batch_eval_prompt_path, "r", encoding="utf-8") as f:
+                self.batch_eval_prompt = f.read()
+
+        # ====== For enhanced consistency scoring ======
+        self.genre_descriptions = genre_descriptions or {
+            "Action": "action, fight, war, mission, killer",
+            "Thriller": "thrill, crime, murder, dark, detective",
+            "Drama": "life, family, love, story",
+            "Comedy": "fun, comedy, funny",
+            "Romance": "love, romance, relationship"
+        }
+        self.model_name = EMBEDDING_MODEL
+        self.embedding_backend = EMBEDDING_BACKEND
+        self.genre_names = list(self.genre_descriptions.keys())
+        self.embedding_cache_dir = embedding_cache_dir
+        if consistency_backend not in ("embedding", "lookup"):
+            raise ValueError(f"Unknown consistency backend: {consistency_backend}")
+        self.consistency_backend = consistency_backend
+        self.catalog_path = catalog_path
+        self.catalog_genres = catalog_genres
+        self._genre_lookup: Optional[GenreLookup] = None
+
+        # 模型、genre 矩阵和标题缓存都在第一次用到时才加载（见 _load_embeddings）
+        self._model = None
+        self._genre_matrix: Optional[np.ndarray] = None
+        self._title_store: Optional[EmbeddingStore] = None
+        self._embeddings_lock = threading.Lock()
+
+    def _load_embeddings(self):
+        if self._genre_matrix is not None:
+            return
+        with self._embeddings_lock:
+            if self._genre_matrix is not None:
+                return
+            model = load_model(self.model_name, self.embedding_backend)
+            # precompute genre embeddings, L2-normalized and stacked as a (G, D) matrix
+            genre_matrix = self._normalize(
+                model.encode(list(self.genre_descriptions.values()), convert_to_numpy=True)
+            )
+            # persistent title embeddings, shared by every process that maps the same directory;
+            # non-torch backends produce slightly different vectors, so they get their own store
+            store_name = self.model_name if self.embedding_backend == "torch" else f"{self.model_name}-{self.embedding_backend}"
+            self._title_store = EmbeddingStore(
+                os.path.join(self.embedding_cache_dir, store_name),
+                dim=genre_matrix.shape[1],
+            ) if self.embedding_cache_dir else None
+            self._model = model
+            self._genre_matrix = genre_matrix
+
+    @property
+    def model(self):
+        self._load_embeddings()
+        return self._model
+
+    @property
+    def genre_matrix(self) -> np.ndarray:
+        self._load_embeddings()
+        return self._genre_matrix
+
+    @property
+    def title_store(self) -> Optional[EmbeddingStore]:
+        self._load_embeddings()
+        return self._title_store
+
+    @property
+    def catalog(self) -> CatalogIndex:
+        return get_catalog(self.catalog_path)
+
+    @property
+    def genre_lookup(self) -> GenreLookup:
+        if self._genre_lookup is None:
+            with self._embeddings_lock:
+                if self._genre_lookup is None:
+                    self._genre_lookup = GenreLookup(self.genre_descriptions, self.catalog)
+        return self._genre_lookup
+
+    @property
+    def embeddings_ready(self) -> bool:
+        return self._genre_matrix is not None
+
+    def warmup(self):
+        """
+        Load the consistency backend (and run one encode for embeddings) so the first evaluation pays no load cost.
+        """
+        print(f"Catalog loaded: {len(self.catalog)} titles")
+        if self.consistency_backend == "lookup":
+            self.genre_lookup.infer_batch(["warmup"])
+            return
+        self._load_embeddings()
+        self._model.encode(["warmup"], convert_to_numpy=True)
+
+    @staticmethod
+    def _normalize(emb: np.ndarray) -> np.ndarray:
+        emb = np.asarray(emb, dtype=np.float32)
+        norms = np.linalg.norm(emb, axis=-1, keepdims=True)
+        return emb / np.maximum(norms, 1e-12)
+
+    def _encode_titles(self, movie_names: List[str]) -> np.ndarray:
+        def encode(names: List[str]) -> np.ndarray:
+            return self._normalize(self.model.encode(names, convert_to_numpy=True))
+
+        if self.title_store is None:
+            return encode(movie_names)
+        return self.title_store.encode(movie_names, encode)
+
+    # ==================================================
+    # ① LLM Semantic Reasoning
+    # ==================================================
+    async def score_reasoning(self, task: Dict[str, Any], output: Dict[str, Any]) -> Dict[str, Any]:
+        prompt = (
+            self.eval_prompt
+            .replace("<<task>>", json.dumps(task, ensure_ascii=False))
+            .replace("<<output>>", json.dumps(output, ensure_ascii=False))
+        )
+
+        raw = await deepseek_chat(
+            messages=[
+                {"role": "system", "content": "You are a strict AI evaluator. Only output JSON {score, reason}"},
+                {"role": "user", "content": prompt}
+            ],
+            model="deepseek-chat",
+            temperature=0
+        )
+
+        try:
+            obj = json.loads(raw)
+            score = float(obj.get("score", 0))
+            reason = obj.get("reason", "")
+            score = max(0.0, min(1.0, score))
+            return {"score": score, "reason": reason}
+        except Exception:
+            return {"score": 0.0, "reason": f"Parsing failed: {raw}"}
+
+    # ==================================================
+    # ② Behavioral Consistency
+    # ==================================================
+    def infer_genres(self, movie_name: str, threshold: float = 0.3) -> List[str]:
+        """
+        Use embedding similarity to infer movie genres.
+        """
+        return self.infer_genres_batch([movie_name], threshold)[0]
+
+    def infer_genres_batch(self, movie_names: List[str], threshold: float = 0.3) -> List[List[str]]:
+        """
+        Infer genres with one encode call and one matrix multiply, or with the hashing
+        classifier for the ``lookup`` backend (``threshold`` only applies to embedding
+        similarity). The lookup backend, and the embedding backend when ``catalog_genres``
+        is on, take recorded genres for titles the catalog knows exactly; fuzzy matches are
+        never used for scoring, so "Heat 2" is not scored as "Heat".
+        """
+        if not movie_names:
+            return []
+        if self.consistency_backend == "lookup":
+            return self.genre_lookup.infer_batch(movie_names)
+
+        if self.catalog_genres:
+            known = self.catalog.genres_batch(movie_names, fuzzy=False)
+        else:
+            known = [None] * len(movie_names)
+        misses = [t for t, g in zip(movie_names, known) if g is None]
+        if not misses:
+            return known
+
+        movie_emb = self._encode_titles(misses)
+        # (N, D) @ (D, G) -> cosine similarity of every title against every genre
+        hits = (movie_emb @ self.genre_matrix.T) >= threshold
+        predicted = iter(
+            [self.genre_names[j] for j in np.flatnonzero(row)]
+            for row in hits
+        )
+        return [g if g is not None else next(predicted) for g in known]
+
+    def score_consistency(self, persona: Dict[str, Any], outputs: List[Dict[str, Any]]) -> float:
+        prefs = set(persona.get("preferences", []))
+        if not prefs or not outputs:
+            return 0.0
+
+        # encode every distinct title across all outputs in a single forward pass
+        titles = list(dict.fromkeys(
+            str(m) for out in outputs for m in (out.get("prediction", []) or [])
+        ))
+        genres_by_title = dict(zip(titles, map(set, self.infer_genres_batch(titles))))
+
+        scores = []
+        for out in outputs:
+            preds = out.get("prediction", [])
+            if not preds:
+                scores.append(0.0)
+                continue
+
+            match_scores = []
+            for m in preds:
+                genres = genres_by_title[str(m)]
+                if not genres:
+                    continue
+                # multi-label intersection-over-union score
+                score = len(genres & prefs) / len(genres | prefs)
+                match_scores.append(score)
+
+            scores.append(np.mean(match_scores) if match_scores else 0.0)
+
+        return float(np.mean(scores)) if scores else 0.0
+
+    # ==================================================
+    # ③ Explainability
+    # ==================================================
+    async def score_explainability(self, persona: Dict[str, Any], output: Dict[str, Any]) -> float:
+        explanation = output.get("explanation", "")
+        if not explanation:
+            return 0.0
+
+        prompt = f"""
+Persona:
+{json.dumps(persona, ensure_ascii=False)}
+
+Explanation:
+{explanation}
+
+Rate from 0 to 1 whether the explanation:
+- References key persona info
+- Reasonably supports final decision
+- Avoids empty templating
+Only output a single number.
+"""
+
+        raw = await deepseek_chat(
+            messages=[
+                {"role": "system", "content": "You are an explanation evaluator. Only output a number"},
+                {"role": "user", "content": prompt}
+            ],
+            model="deepseek-chat",
+            temperature=0
+        )
+
+        try:
+            return max(0.0, min(1.0, float(raw.strip())))
+        except Exception:
+            return 0.0
+
+    # ==================================================
+    # ④ Structural metrics
+    # ==================================================
+    def score_structural(self, task: Dict[str, Any], output: Dict[str, Any]) -> Dict[str, float]:
+        truth = []
+        for x in task.get("ground_truth", []):
+            if isinstance(x, dict):
+                truth.append(x.get("title", ""))
+            elif isinstance(x, str):
+                truth.append(x)
+
+        pred = output.get("prediction", [])
+        if isinstance(pred, str):
+            pred = [pred]
+
+        if not truth or not pred:
+            return {"precision": 0.0, "recall": 0.0, "ndcg": 0.0, "mrr": 0.0, "hit_rate": 0.0}
+
+        # one pass over the top-5 computes every ranking metric; titles resolve to catalog ids
+        # when known, so aliases and "(year)" suffixes match the ground truth
+        metrics = ranking_metrics(pred, truth, ks=(5,), key=self.catalog.match_key)
+        return {
+            "precision": metrics["precision@5"],
+            "recall": metrics["recall@5"],
+            "ndcg": metrics["ndcg@5"],
+            "mrr": metrics["mrr@5"],
+            "hit_rate": metrics["hit_rate@5"]
+        }
+
+    # ==================================================
+    # ⑤ Batched judging (semantic + explainability)
+    # ==================================================
+    async def score_batch(
+        self,
+        persona: Dict[str, Any],
+        items: List[Any],
+        batch_size: int = JUDGE_BATCH_SIZE,
+    ) -> List[Dict[str, Any]]:
+        """
+        Judge many (task, output) pairs for one persona, packing both rubric
+        dimensions for up to ``batch_size`` items into a single LLM request.
+        Returns one {"semantic": {score, reason}, "explainability": float} per item.
+        """
+        if not items:
+            return []
+
+        size = max(1, batch_size)
+        chunks = [items[i:i + size] for i in range(0, len(items), size)]
+        judged = await asyncio.gather(*(self._score_chunk(persona, chunk) for chunk in chunks))
+        return [entry for chunk in judged for entry in chunk]
+
+    async def _score_chunk(self, persona: Dict[str, Any], chunk: List[Any]) -> List[Dict[str, Any]]:
+        parsed: Dict[int, Dict[str, Any]] = {}
+
+        if self.batch_eval_prompt is not None:
+            payload = []
+            for i, (task, output) in enumerate(chunk):
+                # persona 只在 prompt 中出现一次，避免每个 item 重复
+                task_input = {k: v for k, v in (task.get("input") or {}).items() if k != "persona"}
+                payload.append({
+                    "id": i,
+                    "instruction": task.get("instruction", ""),
+                    "input": task_input,
+                    "ground_truth": task.get("ground_truth", []),
+                    "prediction": output.get("prediction", []),
+                    "explanation": output.get("explanation", ""),
+                })
+
+            prompt = (
+                self.batch_eval_prompt
+                .replace("<<persona>>", json.dumps(persona, ensure_ascii=False))
+                .replace("<<items>>", json.dumps(payload, ensure_ascii=False))
+            )
+
+            raw = await deepseek_chat(
+                messages=[
+                    {"role": "system", "content": "You are a strict AI evaluator. Only output JSON {items: [...]}"},
+                    {"role": "user", "content": prompt}
+                ],
+                model="deepseek-chat",
+                temperature=0
+            )
+            parsed = self._parse_batch(raw)
+
+        async def resolve(i: int, task: Dict[str, Any], output: Dict[str, Any]) -> Dict[str, Any]:
+            entry = parsed.get(i)
+            if entry is None:
+                # 批量结果缺失或无法解析时，退回单条评审
+                semantic, explainability = await asyncio.gather(
+                    self.score_reasoning(task, output),
+                    self.score_explainability(persona, output),
+                )
+                return {"semantic": semantic, "explainability": explainability}
+
+            # 与单条评审一致：没有 explanation 直接记 0
+            if not output.get("explanation", ""):
+                entry["explainability"] = 0.0
+            return entry
+
+        return list(await asyncio.gather(
+            *(resolve(i, task, output) for i, (task, output) in enumerate(chunk))
+        ))
+
+    @staticmethod
+    def _parse_batch(raw: str) -> Dict[int, Dict[str, Any]]:
+        text = raw.strip()
+        if text.startswith("```"):
+            text = text.strip("` \n")
+        if text.startswith("json"):
+            text = text[4:].strip()
+
+        try:
+            obj = json.loads(text)
+        except Exception:
+            return {}
+
+        entries = obj.get("items", []) if isinstance(obj, dict) else obj
+        if not isinstance(entries, list):
+            return {}
+
+        parsed = {}
+        for entry in entries:
+            try:
+                idx = int(entry["id"])
+                semantic = max(0.0, min(1.0, float(entry["semantic_score"])))
+                explainability = max(0.0, min(1.0, float(entry["explainability_score"])))
+            except Exception:
+                continue
+            parsed[idx] = {
+                "semantic": {"score": semantic, "reason": str(entry.get("semantic_reason", ""))},
+                "explainability": explainability,
+            }
+        return parsed
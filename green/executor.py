@@ -1,69 +1,108 @@
-# agentbeats/green/executor.py
-from a2a.server.agent_execution import AgentExecutor, RequestContext
-from a2a.server.events import EventQueue
-from a2a.server.tasks import TaskUpdater
-from a2a.types import (
-    Task,
-    TaskState,
-    UnsupportedOperationError,
-    InvalidRequestError,
-)
-from a2a.utils.errors import ServerError
-from a2a.utils import (
-    new_agent_text_message,
-    new_task,
-)
-
-from agent import GreenA2AAgent
-
-
-TERMINAL_STATES = {
-    TaskState.completed,
-    TaskState.canceled,
-    TaskState.failed,
-    TaskState.rejected
-}
-
-
-class Executor(AgentExecutor):
-    def __init__(self):
-        self.agents: dict[str, GreenA2AAgent] = {} # context_id to agent instance
-
-
-    async def get_methods(self):
-        return ["a2a.execute", "execute", "process_message"]
-
-    async def execute(self, context: RequestContext, event_queue: EventQueue) -> None:
-        msg = context.message
-        if not msg:
-            raise ServerError(error=InvalidRequestError(message="Missing message in request"))
-        
-        msg = context.message
-
-        task = context.current_task
-        if task and task.status.state in TERMINAL_STATES:
-            raise ServerError(error=InvalidRequestError(message=f"Task {task.id} already processed (state: {task.status.state})"))
-
-        if not task:
-            task = new_task(msg)
-            await event_queue.enqueue_event(task)
-
-        context_id = task.context_id
-        agent = self.agents.get(context_id)
-        if not agent:
-            agent = GreenA2AAgent()
-            self.agents[context_id] = agent
-
-        updater = TaskUpdater(event_queue, task.id, context_id)
-
-        await updater.start_work()
-        try:
-            await agent.run(msg, updater)
-            if not updater._terminal_state_reached:
-                await updater.complete()
-        except Exception as e:
-            print(f"Task failed with agent error: {e}")
-            await updater.failed(new_agent_text_message(f"Agent error: {e}", context_id=context_id, task_id=task.id))
-
-    async def cancel(self, context: RequestContext, event_queue: EventQueue) -> None:
+# agentbeats/green/executor.py
+import os
+import time
+
+from a2a.server.agent_execution import AgentExecutor, RequestContext
+from a2a.server.events import EventQueue
+from a2a.server.tasks import TaskUpdater
+from a2a.types import (
+    Task,
+    TaskState,
+    UnsupportedOperationError,
+    InvalidRequestError,
+)
+from a2a.utils.errors import ServerError
+from a2a.utils import (
+    new_agent_text_message,
+    new_task,
+)
+
+from agent import GreenA2AAgent
+
+
+# 非终态（未完成）会话的 agent 闲置超过该时间后回收
+AGENT_IDLE_TIMEOUT = float(os.getenv("GREEN_AGENT_IDLE_TIMEOUT", "600"))
+
+TERMINAL_STATES = {
+    TaskState.completed,
+    TaskState.canceled,
+    TaskState.failed,
+    TaskState.rejected
+}
+
+
+class Executor(AgentExecutor):
+    def __init__(self, idle_timeout: float = AGENT_IDLE_TIMEOUT):
+        self.agents: dict[str, GreenA2AAgent] = {} # context_id to agent instance
+        self._last_used: dict[str, float] = {}
+        self._active: dict[str, int] = {}
+        self.idle_timeout = idle_timeout
+
+
+    async def get_methods(self):
+        return ["a2a.execute", "execute", "process_message"]
+
+    async def execute(self, context: RequestContext, event_queue: EventQueue) -> None:
+        msg = context.message
+        if not msg:
+            raise ServerError(error=InvalidRequestError(message="Missing message in request"))
+        
+        msg = context.message
+
+        task = context.current_task
+        if task and task.status.state in TERMINAL_STATES:
+            raise ServerError(error=InvalidRequestError(message=f"Task {task.id} already processed (state: {task.status.state})"))
+
+        if not task:
+            task = new_task(msg)
+            await event_queue.enqueue_event(task)
+
+        self._evict_idle()
+
+        context_id = task.context_id
+        agent = self.agents.get(context_id)
+        if not agent:
+            # agent 很轻量：共享 registry 中的模型和 persona，只新建会话状态
+            agent = GreenA2AAgent()
+            self.agents[context_id] = agent
+        self._active[context_id] = self._active.get(context_id, 0) + 1
+
+        updater = TaskUpdater(event_queue, task.id, context_id)
+
+        await updater.start_work()
+        try:
+            await agent.run(msg, updater)
+            if not updater._terminal_state_reached:
+                await updater.complete()
+        except Exception as e:
+            print(f"Task failed with agent error: {e}")
+            await updater.failed(new_agent_text_message(f"Agent error: {e}", context_id=context_id, task_id=task.id))
+        finally:
+            self._release(context_id, updater._terminal_state_reached)
+
+    def _release(self, context_id: str, finished: bool):
+        active = self._active.get(context_id, 1) - 1
+        if active > 0:
+            self._active[context_id] = active
+            return
+
+        self._active.pop(context_id, None)
+        if finished:
+            # 任务已到终态，立即回收该会话的 agent
+            self.agents.pop(context_id, None)
+            self._last_used.pop(context_id, None)
+        else:
+            self._last_used[context_id] = time.monotonic()
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        expired = [
+            cid for cid, ts in self._last_used.items()
+            if cid not in self._active and now - ts > self.idle_timeout
+        ]
+        for cid in expired:
+            self.agents.pop(cid, None)
+            self._last_used.pop(cid, None)
+
+    async def cancel(self, context: RequestContext, event_queue: EventQueue) -> None:
         raise ServerError(error=UnsupportedOperationError())
\ No newline at end of file
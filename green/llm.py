@@ -1,35 +1,163 @@
-# agentbeats/green/llm.py
-
-import requests
-import os
-
-DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
-DEEPSEEK_URL = "https://api.deepseek.com/v1/chat/completions"
-
-
-
-def deepseek_chat(messages, model="deepseek-chat", temperature=0.3):
-
-    if not DEEPSEEK_API_KEY:
-        return "[DeepSeek Error: Missing API Key]"
-
-    try:
-        payload = {
-            "model": model,
-            "messages": messages,
-            "temperature": temperature
-        }
-
-        headers = {
-            "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
-            "Content-Type": "application/json"
-        }
-
-        resp = requests.post(DEEPSEEK_URL, headers=headers, json=payload)
-        resp.raise_for_status()
-
-        data = resp.json()
-        return data["choices"][0]["message"]["content"]
-
-    except Exception as e:
-        return f"[DeepSeek Error]: {e}"
\ No newline at end of file
+# agentbeats/green/llm.py
+
+import asyncio
+import os
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from llm_cache import cache_key, get_cache
+from metrics import inc
+
+DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
+DEEPSEEK_URL = os.getenv("DEEPSEEK_URL", "https://api.deepseek.com/v1/chat/completions")
+
+# deepseek: HTTP 调用 DEEPSEEK_URL（也可以指向本地 mock_llm.py 服务）；mock: 进程内确定性假后端
+LLM_BACKEND = os.getenv("LLM_BACKEND", "deepseek")
+
+# 连接池 / 并发 / 超时配置，均可通过环境变量覆盖
+DEEPSEEK_TIMEOUT = float(os.getenv("DEEPSEEK_TIMEOUT", "120"))
+DEEPSEEK_CONNECT_TIMEOUT = float(os.getenv("DEEPSEEK_CONNECT_TIMEOUT", "10"))
+DEEPSEEK_MAX_CONNECTIONS = int(os.getenv("DEEPSEEK_MAX_CONNECTIONS", "16"))
+DEEPSEEK_MAX_KEEPALIVE = int(os.getenv("DEEPSEEK_MAX_KEEPALIVE", "8"))
+DEEPSEEK_KEEPALIVE_EXPIRY = float(os.getenv("DEEPSEEK_KEEPALIVE_EXPIRY", "30"))
+DEEPSEEK_MAX_CONCURRENCY = int(os.getenv("DEEPSEEK_MAX_CONCURRENCY", "8"))
+
+
+class DeepSeekClient:
+    """
+    Async DeepSeek chat client sharing one pooled, keep-alive HTTP connection set.
+    A semaphore caps the number of in-flight requests independently of the pool size.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = DEEPSEEK_API_KEY,
+        url: str = DEEPSEEK_URL,
+        timeout: float = DEEPSEEK_TIMEOUT,
+        connect_timeout: float = DEEPSEEK_CONNECT_TIMEOUT,
+        max_connections: int = DEEPSEEK_MAX_CONNECTIONS,
+        max_keepalive: int = DEEPSEEK_MAX_KEEPALIVE,
+        keepalive_expiry: float = DEEPSEEK_KEEPALIVE_EXPIRY,
+        max_concurrency: int = DEEPSEEK_MAX_CONCURRENCY,
+    ):
+        self.api_key = api_key
+        self.url = url
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self._http: Optional[httpx.AsyncClient] = None
+
+    @property
+    def backend(self) -> str:
+        # 作为缓存 key 的一部分：指向 mock_llm.py 服务时 URL 不同，缓存互不串用
+        return f"deepseek:{self.url}"
+
+    def _get_http(self) -> httpx.AsyncClient:
+        # 懒创建，保证 AsyncClient 绑定到实际运行的事件循环
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=self.limits,
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json",
+                },
+            )
+        return self._http
+
+    async def chat(
+        self,
+        messages: List[Dict[str, Any]],
+        model: str = "deepseek-chat",
+        temperature: float = 0.3,
+        timeout: Optional[float] = None,
+    ) -> str:
+        if not self.api_key:
+            return "[DeepSeek Error: Missing API Key]"
+
+        payload = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature
+        }
+
+        try:
+            async with self._semaphore:
+                resp = await self._get_http().post(
+                    self.url,
+                    json=payload,
+                    timeout=httpx.USE_CLIENT_DEFAULT if timeout is None else timeout,
+                )
+            resp.raise_for_status()
+
+            data = resp.json()
+            usage = data.get("usage") or {}
+            inc("green_llm_tokens_total", usage.get("prompt_tokens", 0), help="LLM tokens consumed", model=model, type="prompt")
+            inc("green_llm_tokens_total", usage.get("completion_tokens", 0), help="LLM tokens consumed", model=model, type="completion")
+            inc("green_llm_requests_total", help="LLM API requests", model=model, outcome="ok")
+            return data["choices"][0]["message"]["content"]
+
+        except Exception as e:
+            inc("green_llm_requests_total", help="LLM API requests", model=model, outcome="error")
+            return f"[DeepSeek Error]: {e}"
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+_client = None
+
+
+def get_client():
+    global _client
+    if _client is None:
+        if LLM_BACKEND == "mock":
+            from mock_llm import MockLLMClient
+            _client = MockLLMClient()
+        else:
+            _client = DeepSeekClient()
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def is_error_response(text: str) -> bool:
+    return text.startswith("[DeepSeek Error")
+
+
+async def deepseek_chat(messages, model="deepseek-chat", temperature=0.3, timeout=None, use_cache=True):
+
+    client = get_client()
+
+    # 相同 (backend, model, temperature, messages) 直接命中本地缓存，不再请求 DeepSeek
+    # 进程内 mock 后端的回复是确定性的假数据，不读也不写缓存
+    cache = get_cache() if use_cache and client.backend != "mock" else None
+    key = None
+    if cache is not None and not cache.bypass:
+        key = cache_key(model, temperature, messages, backend=client.backend)
+        # SQLite 读写放到线程里，不阻塞事件循环
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached is not None:
+            inc("green_llm_cache_total", help="LLM response cache lookups", result="hit")
+            return cached
+        inc("green_llm_cache_total", help="LLM response cache lookups", result="miss")
+
+    content = await client.chat(messages, model=model, temperature=temperature, timeout=timeout)
+
+    # 错误信息不写入缓存
+    if key is not None and not is_error_response(content):
+        await asyncio.to_thread(cache.put, key, model, content)
+
+    return content
@@ -1,135 +1,430 @@
-# agentbeats/green/messenger.py
-import json
-from uuid import uuid4
-
-import httpx
-from a2a.client import (
-    A2ACardResolver,
-    ClientConfig,
-    ClientFactory,
-    Consumer,
-)
-from a2a.types import (
-    Message,
-    Part,
-    Role,
-    TextPart,
-    DataPart,
-)
-
-
-DEFAULT_TIMEOUT = 300
-
-
-def create_message(
-    *, role: Role = Role.user, text: str, context_id: str | None = None
-) -> Message:
-    return Message(
-        kind="message",
-        role=role,
-        parts=[Part(TextPart(kind="text", text=text))],
-        message_id=uuid4().hex,
-        context_id=context_id,
-    )
-
-
-def merge_parts(parts: list[Part]) -> str:
-    chunks = []
-    for part in parts:
-        if isinstance(part.root, TextPart):
-            chunks.append(part.root.text)
-        elif isinstance(part.root, DataPart):
-            chunks.append(json.dumps(part.root.data, indent=2))
-    return "\n".join(chunks)
-
-
-async def send_message(
-    message: str,
-    base_url: str,
-    context_id: str | None = None,
-    streaming: bool = False,
-    timeout: int = DEFAULT_TIMEOUT,
-    consumer: Consumer | None = None,
-):
-    """Returns dict with context_id, response and status (if exists)"""
-    async with httpx.AsyncClient(timeout=timeout) as httpx_client:
-        resolver = A2ACardResolver(httpx_client=httpx_client, base_url=base_url)
-        agent_card = await resolver.get_agent_card()
-        config = ClientConfig(
-            httpx_client=httpx_client,
-            streaming=streaming,
-        )
-        factory = ClientFactory(config)
-        client = factory.create(agent_card)
-        if consumer:
-            await client.add_event_consumer(consumer)
-
-        outbound_msg = create_message(text=message, context_id=context_id)
-        last_event = None
-        outputs = {"response": "", "context_id": None}
-
-        # if streaming == False, only one event is generated
-        async for event in client.send_message(outbound_msg):
-            last_event = event
-
-        match last_event:
-            case Message() as msg:
-                outputs["context_id"] = msg.context_id
-                outputs["response"] += merge_parts(msg.parts)
-
-            case (task, update):
-                outputs["context_id"] = task.context_id
-                outputs["status"] = task.status.state.value
-                msg = task.status.message
-                if msg:
-                    outputs["response"] += merge_parts(msg.parts)
-                if task.artifacts:
-                    for artifact in task.artifacts:
-                        outputs["response"] += merge_parts(artifact.parts)
-
-            case _:
-                pass
-
-
-        return outputs
-
-
-class Messenger:
-    def __init__(self):
-        self._context_ids = {}
-
-    async def talk_to_agent(
-        self,
-        message: str,
-        url: str,
-        new_conversation: bool = False,
-        timeout: int = DEFAULT_TIMEOUT,
-    ):
-        """
-        Communicate with another agent by sending a message and receiving their response.
-
-        Args:
-            message: The message to send to the agent
-            url: The agent's URL endpoint
-            new_conversation: If True, start fresh conversation; if False, continue existing conversation
-            timeout: Timeout in seconds for the request (default: 300)
-
-        Returns:
-            str: The agent's response message
-        """
-        print(f"=== talk_to_agent ===")
-        print(f"Send to {url}: {message[:100]}...")
-        
-        outputs = await send_message(
-            message=message,
-            base_url=url,
-            context_id=None if new_conversation else self._context_ids.get(url, None),
-            timeout=timeout,
-        )
-        if outputs.get("status", "completed") != "completed":
-            raise RuntimeError(f"{url} responded with: {outputs}")
-        self._context_ids[url] = outputs.get("context_id", None)
-        return outputs["response"]
-
-    def reset(self):
+# agentbeats/green/messenger.py
+import asyncio
+import json
+import os
+import time
+from typing import Any
+from uuid import uuid4
+
+import httpx
+from a2a.client import (
+    A2ACardResolver,
+    Client,
+    ClientCallContext,
+    ClientConfig,
+    ClientFactory,
+    Consumer,
+)
+from a2a.types import (
+    AgentCard,
+    Message,
+    Part,
+    Role,
+    TextPart,
+    DataPart,
+)
+
+from resilience import PURPLE_RETRIES, call_with_retry, circuit_breaker
+
+
+# 单次 purple 调用的截止时间（秒）
+DEFAULT_TIMEOUT = float(os.getenv("PURPLE_CALL_TIMEOUT", "60"))
+PURPLE_MAX_CONCURRENCY = int(os.getenv("PURPLE_MAX_CONCURRENCY", "4"))
+
+# 每个 purple 端点一个进程级信号量，所有评估共享同一个并发上限
+_endpoint_semaphores: dict[str, asyncio.Semaphore] = {}
+
+
+def endpoint_semaphore(url: str, limit: int = PURPLE_MAX_CONCURRENCY) -> asyncio.Semaphore:
+    sem = _endpoint_semaphores.get(url)
+    if sem is None:
+        sem = asyncio.Semaphore(max(1, limit))
+        _endpoint_semaphores[url] = sem
+    return sem
+
+
+# 批量协议：purple agent card 中带该 tag 的 skill 表示一条消息可以携带多个任务
+BATCH_SKILL_TAG = "batch-tasks"
+PURPLE_BATCH_SIZE = int(os.getenv("PURPLE_BATCH_SIZE", "8"))
+# 攒批等待时间（秒）：第一个任务到达后最多等这么久再发送
+PURPLE_BATCH_LINGER = float(os.getenv("PURPLE_BATCH_LINGER", "0.005"))
+
+# 连接池 / keep-alive / agent card 缓存配置
+A2A_MAX_CONNECTIONS = int(os.getenv("A2A_MAX_CONNECTIONS", "32"))
+A2A_MAX_KEEPALIVE = int(os.getenv("A2A_MAX_KEEPALIVE", "16"))
+A2A_KEEPALIVE_EXPIRY = float(os.getenv("A2A_KEEPALIVE_EXPIRY", "60"))
+AGENT_CARD_TTL = float(os.getenv("AGENT_CARD_TTL", "300"))
+
+
+class AgentConnection:
+    """
+    Long-lived pooled httpx client, cached agent card and A2A clients for one agent URL.
+    """
+
+    def __init__(self, base_url: str, limits: httpx.Limits, card_ttl: float = AGENT_CARD_TTL):
+        self.base_url = base_url
+        self.card_ttl = card_ttl
+        self.httpx_client = httpx.AsyncClient(timeout=DEFAULT_TIMEOUT, limits=limits)
+
+        self._card: AgentCard | None = None
+        self._card_fetched_at = 0.0
+        self._clients: dict[bool, Client] = {}
+        self._lock = asyncio.Lock()
+
+    async def get_card(self) -> AgentCard:
+        async with self._lock:
+            expired = time.monotonic() - self._card_fetched_at > self.card_ttl
+            if self._card is None or expired:
+                resolver = A2ACardResolver(httpx_client=self.httpx_client, base_url=self.base_url)
+                self._card = await resolver.get_agent_card()
+                self._card_fetched_at = time.monotonic()
+                self._clients = {}
+            return self._card
+
+    async def get_client(self, streaming: bool = False, consumer: Consumer | None = None) -> Client:
+        card = await self.get_card()
+        factory = ClientFactory(ClientConfig(httpx_client=self.httpx_client, streaming=streaming))
+
+        # consumer 只对单次调用生效，不能挂到共享 client 上
+        if consumer:
+            return factory.create(card, consumers=[consumer])
+
+        client = self._clients.get(streaming)
+        if client is None:
+            client = factory.create(card)
+            self._clients[streaming] = client
+        return client
+
+    def invalidate(self):
+        # 调用出错时丢弃缓存的 card 和 client，下次调用重新解析
+        self._card = None
+        self._card_fetched_at = 0.0
+        self._clients = {}
+
+    async def aclose(self):
+        self.invalidate()
+        await self.httpx_client.aclose()
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        max_connections: int = A2A_MAX_CONNECTIONS,
+        max_keepalive: int = A2A_MAX_KEEPALIVE,
+        keepalive_expiry: float = A2A_KEEPALIVE_EXPIRY,
+        card_ttl: float = AGENT_CARD_TTL,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.card_ttl = card_ttl
+        self._connections: dict[str, AgentConnection] = {}
+
+    def get(self, base_url: str) -> AgentConnection:
+        conn = self._connections.get(base_url)
+        if conn is None:
+            conn = AgentConnection(base_url, self.limits, self.card_ttl)
+            self._connections[base_url] = conn
+        return conn
+
+    async def aclose(self):
+        connections, self._connections = self._connections, {}
+        for conn in connections.values():
+            await conn.aclose()
+
+
+_default_pool: ConnectionPool | None = None
+
+
+def default_pool() -> ConnectionPool:
+    global _default_pool
+    if _default_pool is None:
+        _default_pool = ConnectionPool()
+    return _default_pool
+
+
+async def close_connections():
+    global _default_pool
+    if _default_pool is not None:
+        await _default_pool.aclose()
+        _default_pool = None
+
+
+def create_message(
+    *, role: Role = Role.user, text: str | None = None, data: dict[str, Any] | None = None, context_id: str | None = None
+) -> Message:
+    # 结构化负载走 DataPart，避免 json.dumps / json.loads 往返
+    part = DataPart(kind="data", data=data) if data is not None else TextPart(kind="text", text=text or "")
+    return Message(
+        kind="message",
+        role=role,
+        parts=[Part(part)],
+        message_id=uuid4().hex,
+        context_id=context_id,
+    )
+
+
+def _collect_parts(parts: list[Part], outputs: dict[str, Any]):
+    for part in parts:
+        if isinstance(part.root, TextPart):
+            outputs["text"].append(part.root.text)
+        elif isinstance(part.root, DataPart):
+            outputs["data"].append(part.root.data)
+
+
+async def send_message(
+    message: str | dict[str, Any],
+    base_url: str,
+    context_id: str | None = None,
+    streaming: bool = False,
+    timeout: float = DEFAULT_TIMEOUT,
+    consumer: Consumer | None = None,
+    pool: ConnectionPool | None = None,
+):
+    """
+    Returns dict with context_id, status (if exists), ``data`` (DataPart payloads, as dicts)
+    and ``text`` (TextPart strings). A dict ``message`` is sent as a DataPart.
+    """
+    connection = (pool or default_pool()).get(base_url)
+    client = await connection.get_client(streaming=streaming, consumer=consumer)
+
+    if isinstance(message, dict):
+        outbound_msg = create_message(data=message, context_id=context_id)
+    else:
+        outbound_msg = create_message(text=message, context_id=context_id)
+    call_context = ClientCallContext(state={"http_kwargs": {"timeout": timeout}})
+    last_event = None
+    outputs = {"context_id": None, "data": [], "text": []}
+
+    # if streaming == False, only one event is generated
+    try:
+        async for event in client.send_message(outbound_msg, context=call_context):
+            last_event = event
+    except Exception:
+        connection.invalidate()
+        raise
+
+    match last_event:
+        case Message() as msg:
+            outputs["context_id"] = msg.context_id
+            _collect_parts(msg.parts, outputs)
+
+        case (task, update):
+            outputs["context_id"] = task.context_id
+            outputs["status"] = task.status.state.value
+            msg = task.status.message
+            if msg:
+                _collect_parts(msg.parts, outputs)
+            if task.artifacts:
+                for artifact in task.artifacts:
+                    _collect_parts(artifact.parts, outputs)
+
+        case _:
+            pass
+
+
+    return outputs
+
+
+def supports_batch(card: AgentCard) -> bool:
+    return any(BATCH_SKILL_TAG in (skill.tags or []) for skill in (card.skills or []))
+
+
+class TaskBatcher:
+    """
+    Coalesces concurrent single-task sends to one batch-capable endpoint.
+
+    Tasks submitted within ``linger`` seconds of each other (up to ``max_batch``) go out as
+    one ``{"tasks": [...]}`` DataPart message; the agent answers with one artifact per task,
+    carrying the task's ``index`` in the batch. The batch gets ``timeout`` per task and a single
+    attempt; tasks it does not answer (or all of them, if it fails) are re-sent one by one
+    with the usual per-task timeout and retries.
+    """
+
+    def __init__(self, messenger: "Messenger", url: str, max_batch: int, linger: float, timeout: float, retries: int):
+        self.messenger = messenger
+        self.url = url
+        self.max_batch = max(1, max_batch)
+        self.linger = linger
+        self.timeout = timeout
+        self.retries = retries
+        self._pending: list[tuple[dict[str, Any], asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._inflight: set[asyncio.Task] = set()
+
+    async def submit(self, task: dict[str, Any]) -> dict[str, Any]:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((task, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.linger, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            # 调用方已取消（超出时间预算）的任务不再发送
+            batch = [(t, f) for t, f in batch if not f.done()]
+            if batch:
+                sender = asyncio.create_task(self._send(batch))
+                self._inflight.add(sender)
+                sender.add_done_callback(self._inflight.discard)
+
+    async def _send(self, batch: list[tuple[dict[str, Any], asyncio.Future]]):
+        # purple 端逐个处理批内任务，截止时间按批大小放大；批量请求只尝试一次，
+        # 失败后逐个任务单独发送（各自带重试），不让一次瞬时错误拖垮整批
+        try:
+            outputs = await self.messenger.exchange(
+                {"tasks": [t for t, _ in batch]}, self.url,
+                new_conversation=True, timeout=self.timeout * len(batch), retries=0,
+            )
+        except Exception as e:
+            print(f"Batch of {len(batch)} tasks to {self.url} failed ({type(e).__name__}: {e}), sending them one by one")
+            outputs = {"data": []}
+
+        by_index = {
+            d["index"]: d for d in outputs["data"]
+            if isinstance(d, dict) and isinstance(d.get("index"), int)
+        }
+        fallback = []
+        for i, (task, future) in enumerate(batch):
+            if future.done():
+                continue
+            payload = by_index.get(i)
+            if payload is None:
+                fallback.append((task, future))
+            else:
+                # 去掉批量协议字段，和单任务路径返回同样的 prediction 结构
+                prediction = {k: v for k, v in payload.items() if k not in ("index", "task_id")}
+                future.set_result({"context_id": outputs.get("context_id"), "status": "completed", "data": [prediction], "text": []})
+
+        if fallback:
+            await asyncio.gather(*(self._send_one(task, future) for task, future in fallback))
+
+    async def _send_one(self, task: dict[str, Any], future: asyncio.Future):
+        try:
+            result = await self.messenger.exchange(
+                task, self.url, new_conversation=True, timeout=self.timeout, retries=self.retries,
+            )
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(result)
+
+
+def render_response(outputs: dict[str, Any]) -> str:
+    """
+    Legacy flat-text view of a response: text parts followed by pretty-printed data parts.
+    """
+    return "\n".join(outputs["text"] + [json.dumps(d, indent=2) for d in outputs["data"]])
+
+
+class Messenger:
+    def __init__(self, pool: ConnectionPool | None = None):
+        self._context_ids = {}
+        # 默认使用进程级共享连接池，per-context 的 Messenger 之间复用连接和 agent card
+        self._pool = pool
+        self._batchers: dict[str, TaskBatcher] = {}
+
+    async def exchange(
+        self,
+        message: str | dict[str, Any],
+        url: str,
+        new_conversation: bool = False,
+        timeout: float = DEFAULT_TIMEOUT,
+        retries: int = PURPLE_RETRIES,
+    ) -> dict[str, Any]:
+        """
+        Send one message (text, or a dict as a DataPart) and return the structured outputs of send_message.
+
+        Each attempt has a ``timeout`` deadline; transient errors are retried with jittered
+        exponential backoff behind a per-endpoint circuit breaker.
+        """
+        context_id = None if new_conversation else self._context_ids.get(url, None)
+
+        async def attempt():
+            # 排队等待信号量的时间不计入截止时间
+            async with endpoint_semaphore(url):
+                return await asyncio.wait_for(
+                    send_message(
+                        message=message,
+                        base_url=url,
+                        context_id=context_id,
+                        timeout=timeout,
+                        pool=self._pool,
+                    ),
+                    timeout,
+                )
+
+        outputs = await call_with_retry(attempt, retries=retries, breaker=circuit_breaker(url))
+        if outputs.get("status", "completed") != "completed":
+            raise RuntimeError(f"{url} responded with: {render_response(outputs)}")
+        self._context_ids[url] = outputs.get("context_id", None)
+        return outputs
+
+    async def talk_to_agent(
+        self,
+        message: str,
+        url: str,
+        new_conversation: bool = False,
+        timeout: float = DEFAULT_TIMEOUT,
+        retries: int = PURPLE_RETRIES,
+    ):
+        """
+        Communicate with another agent by sending a message and receiving their response.
+
+        Args:
+            message: The message to send to the agent
+            url: The agent's URL endpoint
+            new_conversation: If True, start fresh conversation; if False, continue existing conversation
+            timeout: Deadline in seconds for each attempt (default: PURPLE_CALL_TIMEOUT, 60)
+            retries: Retries for transient errors, with jittered exponential backoff
+
+        Returns:
+            str: The agent's response message
+        """
+        print(f"=== talk_to_agent ===")
+        print(f"Send to {url}: {message[:100]}...")
+
+        outputs = await self.exchange(message, url, new_conversation, timeout, retries)
+        return render_response(outputs)
+
+    async def send_task(
+        self,
+        task: dict[str, Any],
+        url: str,
+        timeout: float = DEFAULT_TIMEOUT,
+        retries: int = PURPLE_RETRIES,
+        batch_size: int = PURPLE_BATCH_SIZE,
+    ) -> dict[str, Any]:
+        """
+        Send one task in a fresh conversation. If the agent card advertises the batch skill,
+        concurrent calls to the same endpoint are coalesced into batch messages; otherwise
+        (or with ``batch_size`` <= 1) each task is its own message.
+        """
+        batcher = None
+        if batch_size > 1:
+            try:
+                card = await (self._pool or default_pool()).get(url).get_card()
+                if supports_batch(card):
+                    batcher = self._batchers.get(url)
+                    if batcher is None:
+                        batcher = TaskBatcher(self, url, batch_size, PURPLE_BATCH_LINGER, timeout, retries)
+                        self._batchers[url] = batcher
+            except Exception as e:
+                print(f"Could not resolve agent card for {url}, sending unbatched: {e}")
+
+        if batcher is None:
+            return await self.exchange(task, url, new_conversation=True, timeout=timeout, retries=retries)
+        return await batcher.submit(task)
+
+    def reset(self):
         self._context_ids = {}
\ No newline at end of file
@@ -0,0 +1,160 @@
+# agentbeats/green/metrics.py
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Dict[str, str]] = None) -> str:
+    pairs = list(key) + sorted((extra or {}).items())
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{v}"' for k, v in pairs)
+    return "{" + body + "}"
+
+
+class MetricsRegistry:
+    """
+    Minimal in-process counters and latency histograms rendered in Prometheus text format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, list]] = {}
+        self._help: Dict[str, Tuple[str, str]] = {}
+
+    def inc(self, name: str, value: float = 1.0, help: str = "", **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._help.setdefault(name, ("counter", help))
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, help: str = "", **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._help.setdefault(name, ("histogram", help))
+            series = self._histograms.setdefault(name, {})
+            # [bucket counts..., sum, count]
+            state = series.setdefault(key, [0] * len(LATENCY_BUCKETS) + [0.0, 0])
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                kind, help_text = self._help[name]
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+
+            for name, series in sorted(self._histograms.items()):
+                kind, help_text = self._help[name]
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for key, state in sorted(series.items()):
+                    for i, bound in enumerate(LATENCY_BUCKETS):
+                        lines.append(f"{name}_bucket{_format_labels(key, {'le': str(bound)})} {state[i]}")
+                    lines.append(f"{name}_bucket{_format_labels(key, {'le': '+Inf'})} {state[-1]}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {state[-2]}")
+                    lines.append(f"{name}_count{_format_labels(key)} {state[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+class EvaluationTimings:
+    """
+    Per-evaluation span totals, embedded as the ``timing`` block of a persona result.
+    """
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Dict[str, float]] = {}
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            s = self._stages.setdefault(stage, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            s["count"] += 1
+            s["total_seconds"] += seconds
+            s["max_seconds"] = max(s["max_seconds"], seconds)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = {
+                stage: {
+                    "count": int(s["count"]),
+                    "total_seconds": round(s["total_seconds"], 4),
+                    "mean_seconds": round(s["total_seconds"] / s["count"], 4),
+                    "max_seconds": round(s["max_seconds"], 4),
+                }
+                for stage, s in sorted(self._stages.items())
+            }
+        return {
+            "wall_seconds": round(time.monotonic() - self.started_at, 4),
+            "stages": stages,
+        }
+
+
+# 当前评估的计时收集器；gather / to_thread 创建的子任务会继承同一个对象
+current_timings: ContextVar[Optional[EvaluationTimings]] = ContextVar("current_timings", default=None)
+
+
+@contextmanager
+def span(stage: str, **labels):
+    """
+    Time a pipeline stage: feeds the ``green_stage_seconds`` histogram and the active evaluation's timing block.
+    """
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        REGISTRY.observe(
+            "green_stage_seconds", elapsed,
+            help="Latency of green evaluation pipeline stages",
+            stage=stage, outcome=outcome, **labels
+        )
+        timings = current_timings.get()
+        if timings is not None:
+            timings.add(stage, elapsed)
+
+
+async def timed(stage: str, awaitable, **labels):
+    with span(stage, **labels):
+        return await awaitable
+
+
+def timed_call(stage: str, fn, *args, **kwargs):
+    with span(stage):
+        return fn(*args, **kwargs)
+
+
+def inc(name: str, value: float = 1.0, help: str = "", **labels):
+    REGISTRY.inc(name, value, help=help, **labels)
+
+
+def render_prometheus() -> str:
+    return REGISTRY.render()
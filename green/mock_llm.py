@@ -0,0 +1,191 @@
+# agentbeats/green/mock_llm.py
+"""
+Deterministic local stand-in for the DeepSeek chat API.
+
+Used in two ways:
+  * in-process, via ``LLM_BACKEND=mock`` (see llm.py), no sockets at all;
+  * as an OpenAI-compatible HTTP server (``python mock_llm.py --port 9100``)
+    that the real DeepSeekClient talks to via ``DEEPSEEK_URL``.
+
+Latency is drawn from a configurable distribution and a configurable fraction of
+calls fail, both from a seeded RNG so load tests are reproducible.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from typing import Any, Dict, List
+
+MOCK_LLM_LATENCY = os.getenv("MOCK_LLM_LATENCY", "fixed:0")
+MOCK_LLM_ERROR_RATE = float(os.getenv("MOCK_LLM_ERROR_RATE", "0"))
+MOCK_LLM_SEED = int(os.getenv("MOCK_LLM_SEED", "0"))
+
+CATALOG = [
+    "The Martian", "Life of Pi", "Into the Wild", "The Revenant", "Cast Away",
+    "The Secret Life of Walter Mitty", "Interstellar", "Gravity", "127 Hours", "Wild",
+    "Heat", "Die Hard", "Mad Max: Fury Road", "John Wick", "The Dark Knight",
+    "Se7en", "Zodiac", "Prisoners", "Gone Girl", "Sicario",
+    "Superbad", "The Grand Budapest Hotel", "Groundhog Day", "Little Miss Sunshine", "Juno",
+    "Titanic", "The Notebook", "La La Land", "Pride & Prejudice", "Before Sunrise",
+    "Forrest Gump", "The Shawshank Redemption", "Good Will Hunting", "Whiplash", "Up",
+]
+
+
+class LatencyModel:
+    """
+    Parses ``fixed:ms``, ``uniform:lo_ms,hi_ms``, ``normal:mean_ms,std_ms`` or ``lognormal:median_ms,sigma``.
+
+    Deliberately duplicated in purple/mock_agent.py: green and purple are packaged as separate
+    images and cannot import each other. Keep the two copies in sync.
+    """
+
+    def __init__(self, spec: str = MOCK_LLM_LATENCY, seed: int = MOCK_LLM_SEED):
+        kind, _, args = spec.partition(":")
+        self.kind = kind or "fixed"
+        self.args = [float(x) for x in args.split(",") if x.strip()] or [0.0]
+        self.rng = random.Random(seed)
+
+    def sample(self) -> float:
+        a = self.args
+        if self.kind == "uniform":
+            ms = self.rng.uniform(a[0], a[1] if len(a) > 1 else a[0])
+        elif self.kind == "normal":
+            ms = self.rng.gauss(a[0], a[1] if len(a) > 1 else 0.0)
+        elif self.kind == "lognormal":
+            ms = a[0] * self.rng.lognormvariate(0.0, a[1] if len(a) > 1 else 0.5)
+        else:
+            ms = a[0]
+        return max(0.0, ms) / 1000.0
+
+
+def _stable_rng(*parts: str) -> random.Random:
+    digest = hashlib.sha256("\x1f".join(parts).encode("utf-8")).digest()
+    return random.Random(int.from_bytes(digest[:8], "big"))
+
+
+def _score(rng: random.Random) -> float:
+    return round(rng.uniform(0.4, 0.95), 2)
+
+
+def canned_response(messages: List[Dict[str, Any]], model: str = "deepseek-chat") -> str:
+    """
+    Deterministic reply for the prompts green sends: same messages, same output.
+    """
+    system = messages[0].get("content", "") if messages else ""
+    user = messages[-1].get("content", "") if messages else ""
+    rng = _stable_rng(model, system, user)
+
+    if "task generator" in system:
+        match = re.search(r"generate (\d+) evaluation tasks", user)
+        count = int(match.group(1)) if match else 3
+        tasks = []
+        for i in range(count):
+            candidates = rng.sample(CATALOG, 10)
+            tasks.append({
+                "task_id": f"task-{i + 1}",
+                "instruction": f"Recommend 5 movies for this persona (variant {i + 1}).",
+                "input": {"history": [], "persona": {}, "candidate_items": candidates, "k": 5},
+                "ground_truth": [{"title": t} for t in rng.sample(candidates, 5)],
+            })
+        return json.dumps(tasks, ensure_ascii=False)
+
+    if "items" in system:
+        ids = sorted({int(x) for x in re.findall(r'"id":\s*(\d+)', user)})
+        return json.dumps({"items": [
+            {"id": i, "semantic_score": _score(rng), "semantic_reason": "mock judgement", "explainability_score": _score(rng)}
+            for i in ids
+        ]})
+
+    if "explanation evaluator" in system:
+        return str(_score(rng))
+
+    return json.dumps({"score": _score(rng), "reason": "mock judgement"})
+
+
+class MockLLMClient:
+    """
+    In-process drop-in for DeepSeekClient.
+    """
+
+    backend = "mock"
+
+    def __init__(self, latency: str = MOCK_LLM_LATENCY, error_rate: float = MOCK_LLM_ERROR_RATE, seed: int = MOCK_LLM_SEED):
+        self.latency = LatencyModel(latency, seed)
+        self.error_rate = error_rate
+        self._rng = random.Random(seed + 1)
+
+    async def chat(self, messages, model="deepseek-chat", temperature=0.3, timeout=None) -> str:
+        await asyncio.sleep(self.latency.sample())
+        if self._rng.random() < self.error_rate:
+            return "[DeepSeek Error]: mock injected failure"
+        return canned_response(messages, model)
+
+    async def aclose(self):
+        pass
+
+
+# =========================
+# OpenAI 兼容的本地 HTTP 服务
+# =========================
+def build_app(latency: str = MOCK_LLM_LATENCY, error_rate: float = MOCK_LLM_ERROR_RATE, seed: int = MOCK_LLM_SEED):
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse
+    from starlette.routing import Route
+
+    latency_model = LatencyModel(latency, seed)
+    error_rng = random.Random(seed + 1)
+
+    async def chat_completions(request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        model = body.get("model", "deepseek-chat")
+
+        await asyncio.sleep(latency_model.sample())
+        if error_rng.random() < error_rate:
+            return JSONResponse({"error": {"message": "mock injected failure"}}, status_code=503)
+
+        content = canned_response(messages, model)
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in messages) // 4
+        return JSONResponse({
+            "id": f"mock-{int(time.time() * 1000)}",
+            "object": "chat.completion",
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(content) // 4,
+                "total_tokens": prompt_tokens + len(content) // 4,
+            },
+        })
+
+    async def health(request):
+        return JSONResponse({"status": "ok", "agent": "mock-llm"})
+
+    return Starlette(routes=[
+        Route("/v1/chat/completions", endpoint=chat_completions, methods=["POST"]),
+        Route("/health", endpoint=health, methods=["GET"]),
+    ])
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run a local mock of the DeepSeek chat API.")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=str, default=MOCK_LLM_LATENCY, help="e.g. fixed:50, uniform:20,200, lognormal:80,0.6")
+    parser.add_argument("--error-rate", type=float, default=MOCK_LLM_ERROR_RATE)
+    parser.add_argument("--seed", type=int, default=MOCK_LLM_SEED)
+    args = parser.parse_args()
+
+    print(f"Starting mock LLM on http://{args.host}:{args.port}/v1/chat/completions")
+    uvicorn.run(build_app(args.latency, args.error_rate, args.seed), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
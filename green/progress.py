@@ -0,0 +1,118 @@
+# agentbeats/green/progress.py
+
+import json
+import os
+import time
+from uuid import uuid4
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from a2a.types import DataPart, Part, TaskState
+from a2a.utils import new_agent_parts_message
+
+SCORE_KEYS = ("semantic", "consistency", "explainability", "final_score")
+
+
+class PersonaProgress:
+    """
+    Streams each scored task of a persona as a `working` status update
+    (task result, running averages, ETA) and spools it to a JSONL file.
+    The persona summary is rebuilt from the spool, in task order.
+    ``checkpoint(index, result)`` is awaited for every scored task so a restarted
+    evaluation can ``restore`` them instead of re-running.
+    """
+
+    def __init__(
+        self,
+        persona_name: str,
+        total_tasks: int,
+        updater=None,
+        spool_dir: str = "results",
+        checkpoint: Optional[Callable[[int, Dict[str, Any]], Awaitable[None]]] = None,
+    ):
+        self.persona_name = persona_name
+        self.total_tasks = total_tasks
+        self.updater = updater
+        self.checkpoint = checkpoint
+
+        os.makedirs(spool_dir, exist_ok=True)
+        # 同一 persona 可能被多个会话同时评估，spool 文件名带随机后缀
+        self.spool_path = os.path.join(spool_dir, f"partial_{persona_name}_{uuid4().hex[:8]}.jsonl")
+        open(self.spool_path, "w", encoding="utf-8").close()
+
+        self.started_at = time.monotonic()
+        self.done = 0
+        self.scored = 0
+        self.restored = 0
+        self._sums = {k: 0.0 for k in SCORE_KEYS}
+
+    def _snapshot(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.started_at
+        remaining = self.total_tasks - self.done
+        # ETA 只按本次运行完成的任务估算，恢复的任务不计耗时
+        ran = self.done - self.restored
+        eta = round(elapsed / ran * remaining, 2) if ran else None
+
+        running = {
+            k: round(v / self.scored, 4) if self.scored else 0.0
+            for k, v in self._sums.items()
+        }
+        return {
+            "event": "GreenAgentProgress",
+            "persona": self.persona_name,
+            "completed": self.done,
+            "total": self.total_tasks,
+            "elapsed_seconds": round(elapsed, 2),
+            "eta_seconds": eta,
+            "running_average": running,
+        }
+
+    def _spool(self, index: int, task_result: Dict[str, Any]):
+        self.scored += 1
+        for k in SCORE_KEYS:
+            self._sums[k] += float(task_result.get(k, 0.0))
+
+        with open(self.spool_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"index": index, "result": task_result}, ensure_ascii=False) + "\n")
+
+    def restore(self, completed: Dict[int, Dict[str, Any]]):
+        """
+        Seed the spool with results checkpointed by an earlier run; no status update is sent.
+        """
+        for index, task_result in sorted(completed.items()):
+            self.done += 1
+            self.restored += 1
+            self._spool(index, task_result)
+
+    async def record(self, index: int, task_result: Optional[Dict[str, Any]]):
+        self.done += 1
+
+        if task_result is not None:
+            self._spool(index, task_result)
+            if self.checkpoint is not None:
+                await self.checkpoint(index, task_result)
+
+        progress = self._snapshot()
+        progress["task"] = task_result
+        print(
+            f"[{self.persona_name}] {self.done}/{self.total_tasks} tasks done, "
+            f"running final_score={progress['running_average']['final_score']}, eta={progress['eta_seconds']}s"
+        )
+
+        if self.updater is not None:
+            await self.updater.update_status(
+                TaskState.working,
+                new_agent_parts_message([Part(root=DataPart(data=progress))]),
+            )
+
+    def results(self) -> List[Dict[str, Any]]:
+        entries = []
+        with open(self.spool_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entries.append(json.loads(line))
+        entries.sort(key=lambda e: e["index"])
+        return [e["result"] for e in entries]
+
+    def cleanup(self):
+        if os.path.exists(self.spool_path):
+            os.remove(self.spool_path)
@@ -0,0 +1,137 @@
+# agentbeats/green/registry.py
+
+import json
+import os
+import threading
+import time
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional
+
+from evaluator import Evaluator
+from task_bank import TaskBank
+from task_generator import TaskGenerator
+
+PERSONA_DIR = "data/personas"
+PROMPTS_DIR = "data/prompts"
+
+
+# =========================
+# Persona 加载
+# =========================
+def load_personas(persona_dir: str) -> Dict[str, dict]:
+
+    personas = {}
+
+    if not os.path.exists(persona_dir):
+        os.makedirs(persona_dir, exist_ok=True)
+        return personas
+
+    for file in os.listdir(persona_dir):
+        if not file.endswith(".json"):
+            continue
+
+        path = os.path.join(persona_dir, file)
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+            # 如果文件里是 list，就逐个取出
+            if isinstance(data, list):
+                for p in data:
+                    if not isinstance(p, dict) or "name" not in p:
+                        continue
+                    personas[p["name"]] = p  # 用 persona 中的 name 做 key
+            # 如果文件里是 dict，取 name
+            elif isinstance(data, dict):
+                if "name" in data:
+                    personas[data["name"]] = data
+
+    return personas
+
+
+class Registry:
+    """
+    Process-wide, read-only resources shared by every GreenA2AAgent:
+    personas, prompt templates, the task generator, the offline task bank and the evaluator (embedding model).
+    """
+
+    def __init__(self, persona_dir: str = PERSONA_DIR, prompts_dir: str = PROMPTS_DIR):
+        self.personas: Mapping[str, dict] = MappingProxyType(load_personas(persona_dir))
+
+        task_prompt_file = os.path.join(prompts_dir, "task_prompt.txt")
+        eval_prompt_file = os.path.join(prompts_dir, "eval_prompt.txt")
+        batch_eval_prompt_file = os.path.join(prompts_dir, "batch_eval_prompt.txt")
+
+        self.task_generator = TaskGenerator(task_prompt_file)
+        self.task_bank = TaskBank()
+        self.evaluator = Evaluator(eval_prompt_file, batch_eval_prompt_path=batch_eval_prompt_file)
+
+
+_registry: Optional[Registry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> Registry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = Registry()
+    return _registry
+
+
+# =========================
+# 后台预热与就绪状态
+# =========================
+class Warmup:
+    """
+    Loads the registry and the embedding model off the event loop and reports readiness.
+    """
+
+    def __init__(self):
+        self.state = "pending"
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def run(self):
+        self.started_at = time.monotonic()
+        self.state = "warming"
+        try:
+            registry = get_registry()
+            registry.evaluator.warmup()
+            self.state = "ready"
+            print(f"Registry warmed: {len(registry.personas)} personas loaded in {time.monotonic() - self.started_at:.2f}s")
+        except Exception as e:
+            self.state = "failed"
+            self.error = f"{type(e).__name__}: {e}"
+            print(f"Warm-up failed: {self.error}")
+        finally:
+            self.finished_at = time.monotonic()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, name="green-warmup", daemon=True)
+                self._thread.start()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def status(self) -> Dict[str, Any]:
+        status: Dict[str, Any] = {"status": self.state}
+        if self.started_at is not None:
+            end = self.finished_at if self.finished_at is not None else time.monotonic()
+            status["seconds"] = round(end - self.started_at, 3)
+        if self.error:
+            status["error"] = self.error
+        return status
+
+
+_warmup = Warmup()
+
+
+def get_warmup() -> Warmup:
+    return _warmup
@@ -0,0 +1,144 @@
+# agentbeats/green/resilience.py
+
+import asyncio
+import os
+import random
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import httpx
+from a2a.client.errors import A2AClientHTTPError, A2AClientTimeoutError
+
+from metrics import inc
+
+T = TypeVar("T")
+
+PURPLE_RETRIES = int(os.getenv("PURPLE_RETRIES", "2"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "8"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Per-endpoint breaker: opens after ``failure_threshold`` consecutive failures,
+    rejects calls for ``reset_timeout`` seconds, then lets a single probe through (half-open).
+    """
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_timeout: float = BREAKER_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before_call(self) -> bool:
+        """
+        Raises CircuitOpenError when the call must not go out; returns True if it is the half-open probe.
+        """
+        state = self.state
+        if state == "open" or (state == "half_open" and self._probing):
+            raise CircuitOpenError(f"Circuit open for {self.name}")
+        if state == "half_open":
+            self._probing = True
+            return True
+        return False
+
+    def release_probe(self):
+        # 探测调用被取消（未得出成功/失败）时放行下一次探测，否则熔断器会一直卡在 half_open
+        self._probing = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                inc("green_circuit_open_total", help="Circuit breaker openings", target=self.name)
+            self.opened_at = time.monotonic()
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def circuit_breaker(name: str) -> CircuitBreaker:
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = CircuitBreaker(name)
+        _breakers[name] = breaker
+    return breaker
+
+
+def is_transient(exc: BaseException) -> bool:
+    if isinstance(exc, (asyncio.TimeoutError, httpx.TimeoutException, httpx.TransportError, A2AClientTimeoutError)):
+        return True
+    if isinstance(exc, A2AClientHTTPError):
+        return exc.status_code == 429 or exc.status_code >= 500
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code == 429 or exc.response.status_code >= 500
+    return False
+
+
+def backoff_delay(attempt: int, base: float = RETRY_BASE_DELAY, cap: float = RETRY_MAX_DELAY) -> float:
+    # full jitter: uniform(0, min(cap, base * 2^attempt))
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+async def call_with_retry(
+    fn: Callable[[], Awaitable[T]],
+    *,
+    retries: int = PURPLE_RETRIES,
+    breaker: Optional[CircuitBreaker] = None,
+) -> T:
+    """
+    Run ``fn``, retrying transient errors with jittered exponential backoff.
+    Per-attempt deadlines are up to ``fn`` (see Messenger.exchange).
+    """
+    attempt = 0
+    while True:
+        probing = breaker.before_call() if breaker is not None else False
+        try:
+            result = await fn()
+        except Exception as e:
+            transient = is_transient(e)
+            # 只有传输层/超时/5xx 计入熔断；端点能正常应答的业务错误不算
+            if breaker is not None:
+                if transient:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+            if attempt >= retries or not transient:
+                raise
+            delay = backoff_delay(attempt)
+            inc("green_retries_total", help="Retried calls after transient errors", target=breaker.name if breaker else "unknown")
+            print(f"Transient error ({type(e).__name__}: {e}), retry {attempt + 1}/{retries} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        except BaseException:
+            # 取消（例如整体时间预算的 wait_for）等：调用没有结论，不计成功也不计失败
+            if probing:
+                breaker.release_probe()
+            raise
+
+        if breaker is not None:
+            breaker.record_success()
+        return result
@@ -1,44 +1,141 @@
-# agentbeats/green/scoring_rules.py
-
-import math
-from typing import List, Dict, Any
-
-def precision_at_k(pred: Any, truth: List[str], k: int) -> float:
-    if isinstance(pred, dict):
-        pred = list(pred.keys())
-    elif not isinstance(pred, list):
-        pred = list(pred)
-    pred_k = pred[:k]
-    hits = sum([1 for x in pred_k if x in truth])
-    return hits / k
-
-
-def recall_at_k(pred: List[str], truth: List[str], k: int) -> float:
-    if isinstance(pred, dict):
-        pred = list(pred.keys())
-    elif not isinstance(pred, list):
-        pred = list(pred)
-    pred_k = pred[:k]
-    hits = sum([1 for x in pred_k if x in truth])
-    if len(truth) == 0:
-        return 0.0
-    return hits / len(truth)
-
-
-def ndcg_at_k(pred: List[str], truth: List[str], k: int) -> float:
-    def dcg(items):
-        s = 0
-        for i, item in enumerate(items):
-            if item in truth:
-                s += 1 / math.log2(i + 2)
-        return s
-    if isinstance(pred, dict):
-        pred = list(pred.keys())
-    elif not isinstance(pred, list):
-        pred = list(pred)
-    dcg_val = dcg(pred[:k])
-    ideal = sorted(truth, key=lambda x: 1, reverse=True)
-    idcg_val = dcg(ideal[:k])
-    if idcg_val == 0:
-        return 0.0
-    return dcg_val / idcg_val
+# agentbeats/green/scoring_rules.py
+
+import re
+import unicodedata
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Set, Tuple
+
+import numpy as np
+
+DEFAULT_KS = (1, 3, 5, 10)
+
+_WS_RE = re.compile(r"\s+")
+
+# DCG 折扣表 1 / log2(rank + 1)，按需扩容，避免在循环里重复算 log2
+_DISCOUNTS = 1.0 / np.log2(np.arange(2, 66, dtype=np.float64))
+_IDEAL_DCG = np.cumsum(_DISCOUNTS)
+
+
+def _discount_tables(k: int) -> Tuple[np.ndarray, np.ndarray]:
+    global _DISCOUNTS, _IDEAL_DCG
+    if k > len(_DISCOUNTS):
+        _DISCOUNTS = 1.0 / np.log2(np.arange(2, 2 * k + 2, dtype=np.float64))
+        _IDEAL_DCG = np.cumsum(_DISCOUNTS)
+    return _DISCOUNTS[:k], _IDEAL_DCG[:k]
+
+
+def fold_title(title: Any) -> str:
+    """
+    Case- and punctuation-insensitive match key for a title.
+    """
+    if isinstance(title, dict):
+        title = title.get("title", "")
+    text = unicodedata.normalize("NFKC", str(title)).casefold()
+    text = "".join(" " if unicodedata.category(ch).startswith("P") else ch for ch in text)
+    return _WS_RE.sub(" ", text).strip()
+
+
+def _as_list(pred: Any) -> List[Any]:
+    if isinstance(pred, dict):
+        return list(pred.keys())
+    if isinstance(pred, str):
+        return [pred]
+    if not isinstance(pred, list):
+        return list(pred)
+    return pred
+
+
+def truth_index(truth: Iterable[Any], key: Callable[[Any], str] = fold_title) -> Set[str]:
+    index = {key(t) for t in truth}
+    index.discard("")
+    return index
+
+
+def relevance(pred: Any, truth: Set[str], k: int, key: Callable[[Any], str] = fold_title) -> np.ndarray:
+    """
+    Binary relevance of the top-k predictions; each ground-truth item counts at most once.
+    ``key`` maps a title to its match key (folded title, or a catalog id).
+    """
+    rel = np.zeros(k, dtype=bool)
+    seen = set()
+    for i, item in enumerate(_as_list(pred)[:k]):
+        item_key = key(item)
+        if item_key in truth and item_key not in seen:
+            rel[i] = True
+            seen.add(item_key)
+    return rel
+
+
+def metrics_from_relevance(rel: np.ndarray, n_truth: np.ndarray, ks: Sequence[int] = DEFAULT_KS) -> Dict[str, np.ndarray]:
+    """
+    Vectorized P / R / nDCG / MRR / hit-rate at every k in ``ks``.
+
+    rel:     (N, K) boolean relevance matrix, K >= max(ks)
+    n_truth: (N,) number of distinct ground-truth items per row
+    """
+    rel = np.asarray(rel, dtype=bool)
+    n_truth = np.asarray(n_truth, dtype=np.int64)
+    K = rel.shape[1]
+    discounts, ideal = _discount_tables(K)
+
+    cum_hits = np.cumsum(rel, axis=1)
+    dcg = np.cumsum(rel * discounts, axis=1)
+    has_hit = rel.any(axis=1)
+    first_hit = np.where(has_hit, rel.argmax(axis=1), K)
+
+    out: Dict[str, np.ndarray] = {}
+    for k in ks:
+        hits = cum_hits[:, k - 1]
+        ideal_k = np.where(n_truth > 0, ideal[np.clip(np.minimum(n_truth, k) - 1, 0, None)], 1.0)
+
+        out[f"precision@{k}"] = hits / k
+        out[f"recall@{k}"] = np.where(n_truth > 0, hits / np.maximum(n_truth, 1), 0.0)
+        out[f"ndcg@{k}"] = np.where(n_truth > 0, dcg[:, k - 1] / ideal_k, 0.0)
+        out[f"mrr@{k}"] = np.where(first_hit < k, 1.0 / (first_hit + 1), 0.0)
+        out[f"hit_rate@{k}"] = (hits > 0).astype(np.float64)
+    return out
+
+
+def ranking_metrics(
+    pred: Any,
+    truth: Iterable[Any],
+    ks: Sequence[int] = DEFAULT_KS,
+    key: Callable[[Any], str] = fold_title,
+) -> Dict[str, float]:
+    """
+    All ranking metrics for one (prediction, ground truth) pair in a single pass.
+    """
+    index = truth_index(truth, key)
+    rel = relevance(pred, index, max(ks), key)
+    metrics = metrics_from_relevance(rel[None, :], np.array([len(index)]), ks)
+    return {name: float(values[0]) for name, values in metrics.items()}
+
+
+def batch_ranking_metrics(
+    pairs: Iterable[Tuple[Any, Iterable[Any]]],
+    ks: Sequence[int] = DEFAULT_KS,
+    key: Callable[[Any], str] = fold_title,
+) -> Dict[str, np.ndarray]:
+    """
+    Score many (prediction, ground truth) pairs at once; returns one (N,) array per metric.
+    """
+    K = max(ks)
+    rows, n_truth = [], []
+    for pred, truth in pairs:
+        index = truth_index(truth, key)
+        rows.append(relevance(pred, index, K, key))
+        n_truth.append(len(index))
+
+    rel = np.stack(rows) if rows else np.zeros((0, K), dtype=bool)
+    return metrics_from_relevance(rel, np.array(n_truth, dtype=np.int64), ks)
+
+
+def precision_at_k(pred: Any, truth: List[str], k: int) -> float:
+    return ranking_metrics(pred, truth, ks=(k,))[f"precision@{k}"]
+
+
+def recall_at_k(pred: List[str], truth: List[str], k: int) -> float:
+    return ranking_metrics(pred, truth, ks=(k,))[f"recall@{k}"]
+
+
+def ndcg_at_k(pred: List[str], truth: List[str], k: int) -> float:
+    return ranking_metrics(pred, truth, ks=(k,))[f"ndcg@{k}"]
@@ -1,79 +1,134 @@
-# agentbeats/green/server.py
-import argparse
-import asyncio
-import os
-
-from starlette.responses import JSONResponse
-from starlette.routing import Route
-import uvicorn
-
-from a2a.server.apps import A2AStarletteApplication
-from a2a.server.request_handlers import DefaultRequestHandler
-from a2a.server.tasks import InMemoryTaskStore
-from a2a.types import AgentCard, AgentSkill, AgentCapabilities
-from executor import Executor
-
-
-
-class DebugRequestHandler(DefaultRequestHandler):
-    async def handle_task_create(self, request):
-        body = await request.json()
-        print("\n Receive new Task")
-        print(body)
-        return await super().handle_task_create(request)
-
-    async def handle_message_create(self, request, task_id: str):
-        body = await request.json()
-        print(f"\n Task {task_id} receive Message")
-        print(body)
-        return await super().handle_message_create(request, task_id)
-
-
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--host", type=str, default="127.0.0.1")
-    parser.add_argument("--port", type=int, default=9009)
-    parser.add_argument("--card-url", type=str)
-    parser.add_argument("--purple-url", type=str, help="Purple Agent URL")
-    args = parser.parse_args()
-
-    skill = AgentSkill(
-        id="agentbeats-green-evaluator-v1",
-        name="Multi-Agent Performance Evaluator",
-        description="Evaluates Purple Agents using personas and multi-criteria scoring.",
-        tags=["evaluation", "benchmark"],
-        examples=["Evaluate Purple Agent"]
-    )
-
-    agent_card = AgentCard(
-        name="Multi-Agent Performance Evaluator",
-        description="Generates evaluation tasks based on personas and scores purple agents.",
-        url=args.card_url or f"http://{args.host}:{args.port}/",
-        version="1.0.0",
-        default_input_modes=["text"],
-        default_output_modes=["text"],
-        capabilities=AgentCapabilities(streaming=True),
-        skills=[skill],
-        preferredTransport="JSONRPC",
-        protocolVersion="0.3.0",
-    )
-
-    request_handler = DebugRequestHandler(
-        agent_executor=Executor(),
-        task_store=InMemoryTaskStore(),
-    )
-
-    server = A2AStarletteApplication(
-        agent_card=agent_card,
-        http_handler=request_handler,
-    )
-
-    print(f"Starting Green Agent on http://{args.host}:{args.port}")
-    print(f"Agent Card: {agent_card.url}.well-known/agent-card.json")
-    app = server.build()
-
-    uvicorn.run(app, host=args.host, port=args.port)
-
-
-if __name__ == "__main__":
-    main()
+# agentbeats/green/server.py
+import argparse
+import asyncio
+import os
+
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+import uvicorn
+
+from a2a.server.apps import A2AStarletteApplication
+from a2a.server.request_handlers import DefaultRequestHandler
+from a2a.server.tasks import InMemoryTaskStore
+from a2a.types import AgentCard, AgentSkill, AgentCapabilities
+from executor import Executor
+from llm import close_client
+from messenger import close_connections
+from metrics import render_prometheus
+from registry import get_warmup
+from task_store import SQLiteTaskStore
+
+
+
+class DebugRequestHandler(DefaultRequestHandler):
+    async def handle_task_create(self, request):
+        body = await request.json()
+        print("\n Receive new Task")
+        print(body)
+        return await super().handle_task_create(request)
+
+    async def handle_message_create(self, request, task_id: str):
+        body = await request.json()
+        print(f"\n Task {task_id} receive Message")
+        print(body)
+        return await super().handle_message_create(request, task_id)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9009)
+    parser.add_argument("--card-url", type=str)
+    parser.add_argument("--purple-url", type=str, help="Purple Agent URL")
+    parser.add_argument(
+        "--warmup",
+        nargs="?",
+        const="blocking",
+        default=os.getenv("GREEN_WARMUP", "background"),
+        help="Embedding model/registry warm-up: 'background' (default, bind first and report via /ready), "
+             "'blocking' (load before binding) or 'off' (load on first evaluation)",
+    )
+    parser.add_argument(
+        "--task-store",
+        choices=["sqlite", "memory"],
+        default=os.getenv("GREEN_TASK_STORE", "sqlite"),
+        help="Where A2A tasks are kept: local SQLite (survives restarts) or process memory",
+    )
+    args = parser.parse_args()
+    warmup_mode = {"1": "blocking", "true": "blocking", "yes": "blocking", "0": "off", "false": "off", "no": "off", "": "off"}.get(
+        args.warmup.lower(), args.warmup.lower()
+    )
+
+    skill = AgentSkill(
+        id="agentbeats-green-evaluator-v1",
+        name="Multi-Agent Performance Evaluator",
+        description="Evaluates Purple Agents using personas and multi-criteria scoring.",
+        tags=["evaluation", "benchmark"],
+        examples=["Evaluate Purple Agent"]
+    )
+
+    agent_card = AgentCard(
+        name="Multi-Agent Performance Evaluator",
+        description="Generates evaluation tasks based on personas and scores purple agents.",
+        url=args.card_url or f"http://{args.host}:{args.port}/",
+        version="1.0.0",
+        default_input_modes=["text"],
+        default_output_modes=["text"],
+        capabilities=AgentCapabilities(streaming=True),
+        skills=[skill],
+        preferredTransport="JSONRPC",
+        protocolVersion="0.3.0",
+    )
+
+    task_store = SQLiteTaskStore() if args.task_store == "sqlite" else InMemoryTaskStore()
+    request_handler = DebugRequestHandler(
+        agent_executor=Executor(),
+        task_store=task_store,
+    )
+
+    server = A2AStarletteApplication(
+        agent_card=agent_card,
+        http_handler=request_handler,
+    )
+
+    print(f"Starting Green Agent on http://{args.host}:{args.port}")
+    print(f"Agent Card: {agent_card.url}.well-known/agent-card.json")
+    app = server.build()
+    app.add_event_handler("shutdown", close_client)
+    app.add_event_handler("shutdown", close_connections)
+
+    async def metrics(request):
+        return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+    warmup = get_warmup()
+
+    async def health(request):
+        # 存活探针：进程在跑就返回 200
+        return JSONResponse({"status": "ok", "agent": "green", "warmup": warmup.status()})
+
+    async def ready(request):
+        # 就绪探针：模型加载完成前返回 503
+        ready_now = warmup.ready or warmup_mode == "off"
+        return JSONResponse(warmup.status(), status_code=200 if ready_now else 503)
+
+    app.router.routes.append(
+        Route("/metrics", endpoint=metrics, methods=["GET"])
+    )
+    app.router.routes.append(
+        Route("/health", endpoint=health, methods=["GET"])
+    )
+    app.router.routes.append(
+        Route("/ready", endpoint=ready, methods=["GET"])
+    )
+
+    if warmup_mode == "blocking":
+        # 在绑定端口前加载模型，healthcheck 通过时即可直接评估
+        warmup.run()
+    elif warmup_mode == "background":
+        app.add_event_handler("startup", warmup.start)
+
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+# agentbeats/green/task_bank.py
+"""
+Offline, versioned bank of pre-generated evaluation tasks.
+
+Layout of ``TASK_BANK_DIR`` (one pair of files per version)::
+
+    tasks-v0003.jsonl   one {"persona", "task_id", "task"} object per line
+    index-v0003.json    {"version", "created_at", "personas": {name: {"fingerprint", "tasks": [[task_id, offset, length], ...]}}}
+
+Only the index is read at startup; sampled tasks are read by byte offset. A persona
+whose definition changed since the bank was built (fingerprint mismatch) counts as a miss.
+
+Build mode (calls the LLM, run offline):
+    python task_bank.py --per-persona 30 --batch-size 5
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+TASK_BANK_DIR = os.getenv("TASK_BANK_DIR", "data/task_bank")
+# latest: 目录里版本号最大的一份；也可以固定成某个版本号
+TASK_BANK_VERSION = os.getenv("TASK_BANK_VERSION", "latest")
+TASK_BANK_SEED = int(os.getenv("TASK_BANK_SEED", "0"))
+
+_INDEX_RE = re.compile(r"^index-v(\d+)\.json$")
+
+
+def persona_fingerprint(persona: Dict[str, Any]) -> str:
+    canonical = json.dumps(persona, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def validate_task(task: Any) -> Optional[str]:
+    """
+    Returns the reason a generated task is unusable, or None if it is valid.
+    """
+    if not isinstance(task, dict):
+        return "not an object"
+    if "error" in task:
+        return task["error"]
+    if not isinstance(task.get("instruction"), str) or not task["instruction"].strip():
+        return "missing instruction"
+    inp = task.get("input")
+    if not isinstance(inp, dict):
+        return "missing input"
+    candidates = inp.get("candidate_items", [])
+    if not isinstance(candidates, list):
+        return "candidate_items is not a list"
+    truth = task.get("ground_truth")
+    if not isinstance(truth, list) or not truth:
+        return "missing ground_truth"
+    k = inp.get("k", 5)
+    if not isinstance(k, int) or k <= 0:
+        return "invalid k"
+    return None
+
+
+def available_versions(bank_dir: str = TASK_BANK_DIR) -> List[int]:
+    if not os.path.isdir(bank_dir):
+        return []
+    return sorted(int(m.group(1)) for m in map(_INDEX_RE.match, os.listdir(bank_dir)) if m)
+
+
+class TaskBank:
+    """
+    Read side: index in memory, tasks read by offset on demand.
+    """
+
+    def __init__(self, bank_dir: str = TASK_BANK_DIR, version: str = TASK_BANK_VERSION):
+        self.bank_dir = bank_dir
+        self.version: Optional[int] = None
+        self.personas: Dict[str, Dict[str, Any]] = {}
+
+        versions = available_versions(bank_dir)
+        if not versions:
+            return
+        self.version = versions[-1] if str(version) == "latest" else int(version)
+
+        with open(os.path.join(bank_dir, f"index-v{self.version:04d}.json"), "r", encoding="utf-8") as f:
+            self.personas = json.load(f)["personas"]
+        self._tasks_path = os.path.join(bank_dir, f"tasks-v{self.version:04d}.jsonl")
+
+    def __bool__(self) -> bool:
+        return bool(self.personas)
+
+    def _read(self, offset: int, length: int, f) -> Dict[str, Any]:
+        f.seek(offset)
+        return json.loads(f.read(length).decode("utf-8"))["task"]
+
+    def sample(self, persona_name: str, persona: Dict[str, Any], count: int, seed: int = TASK_BANK_SEED) -> Optional[List[Dict[str, Any]]]:
+        """
+        ``count`` tasks for the persona, the same ones for the same seed; None on a miss.
+        """
+        entry = self.personas.get(persona_name)
+        if entry is None or entry.get("fingerprint") != persona_fingerprint(persona):
+            return None
+        refs = entry["tasks"]
+        if len(refs) < count:
+            return None
+
+        rng = random.Random(f"{seed}:{persona_name}")
+        picked = rng.sample(refs, count)
+        with open(self._tasks_path, "rb") as f:
+            return [self._read(offset, length, f) for _, offset, length in picked]
+
+
+# =========================
+# 离线构建
+# =========================
+async def build_bank(
+    personas: Dict[str, Dict[str, Any]],
+    task_generator,
+    per_persona: int,
+    batch_size: int = 5,
+    max_attempts: int = 10,
+    bank_dir: str = TASK_BANK_DIR,
+    version: Optional[int] = None,
+    concurrency: int = 4,
+    temperature: float = 0.9,
+) -> str:
+    """
+    Generate, validate and de-duplicate ``per_persona`` tasks for every persona, then write a new bank version.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def collect(name: str, persona: Dict[str, Any]) -> List[Dict[str, Any]]:
+        tasks, seen = [], set()
+        for _ in range(max_attempts):
+            if len(tasks) >= per_persona:
+                break
+            async with semaphore:
+                # 需要多样的任务：提高温度并绕过 LLM 缓存
+                generated = await task_generator.generate_tasks(
+                    persona,
+                    task_count=min(batch_size, per_persona - len(tasks)),
+                    temperature=temperature,
+                    use_cache=False,
+                )
+            for task in generated:
+                reason = validate_task(task)
+                if reason:
+                    print(f"[{name}] dropped task: {reason}")
+                    continue
+                # 同样的输入视为重复任务
+                key = json.dumps(task["input"], ensure_ascii=False, sort_keys=True)
+                if key in seen:
+                    continue
+                seen.add(key)
+                task["task_id"] = f"{name}-{len(tasks) + 1:04d}"
+                tasks.append(task)
+        print(f"[{name}] {len(tasks)}/{per_persona} tasks")
+        return tasks[:per_persona]
+
+    names = list(personas.keys())
+    collected = await asyncio.gather(*(collect(n, personas[n]) for n in names))
+
+    os.makedirs(bank_dir, exist_ok=True)
+    if version is None:
+        version = (available_versions(bank_dir) or [0])[-1] + 1
+    tasks_path = os.path.join(bank_dir, f"tasks-v{version:04d}.jsonl")
+    index_path = os.path.join(bank_dir, f"index-v{version:04d}.json")
+
+    index: Dict[str, Dict[str, Any]] = {}
+    with open(tasks_path + ".tmp", "wb") as f:
+        for name, tasks in zip(names, collected):
+            refs = []
+            for task in tasks:
+                line = json.dumps({"persona": name, "task_id": task["task_id"], "task": task}, ensure_ascii=False).encode("utf-8")
+                refs.append([task["task_id"], f.tell(), len(line)])
+                f.write(line + b"\n")
+            index[name] = {"fingerprint": persona_fingerprint(personas[name]), "tasks": refs}
+
+    with open(index_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({
+            "version": version,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "personas": index,
+        }, f, ensure_ascii=False)
+
+    # 先落 tasks 再落 index：读端只认 index，index 出现时 tasks 一定完整
+    os.replace(tasks_path + ".tmp", tasks_path)
+    os.replace(index_path + ".tmp", index_path)
+    return index_path
+
+
+def main():
+    from registry import PERSONA_DIR, PROMPTS_DIR, load_personas
+    from task_generator import TaskGenerator
+
+    parser = argparse.ArgumentParser(description="Build a versioned offline task bank.")
+    parser.add_argument("--per-persona", type=int, default=30)
+    parser.add_argument("--batch-size", type=int, default=5, help="Tasks requested per LLM call")
+    parser.add_argument("--personas", type=str, default="", help="Comma-separated subset; default all")
+    parser.add_argument("--bank-dir", type=str, default=TASK_BANK_DIR)
+    parser.add_argument("--version", type=int, help="Version number; default latest + 1")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--temperature", type=float, default=0.9)
+    args = parser.parse_args()
+
+    personas = load_personas(PERSONA_DIR)
+    if args.personas:
+        wanted = [p.strip() for p in args.personas.split(",") if p.strip()]
+        personas = {name: personas[name] for name in wanted}
+
+    generator = TaskGenerator(os.path.join(PROMPTS_DIR, "task_prompt.txt"))
+    index_path = asyncio.run(build_bank(
+        personas, generator, args.per_persona, args.batch_size,
+        bank_dir=args.bank_dir, version=args.version, concurrency=args.concurrency,
+        temperature=args.temperature,
+    ))
+    print(f"Task bank written: {index_path}")
+
+
+if __name__ == "__main__":
+    main()
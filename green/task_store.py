@@ -0,0 +1,241 @@
+# agentbeats/green/task_store.py
+"""
+Durable green-side state in a local SQLite file:
+
+  * ``SQLiteTaskStore`` - A2A ``TaskStore`` so task status/history survive a restart;
+  * ``CheckpointStore`` - the task list and every scored task result of an evaluation,
+    keyed by (context_id, persona), so re-submitting an interrupted evaluation with the
+    same context and the same config resumes instead of redoing purple and judge calls.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from a2a.server.context import ServerCallContext
+from a2a.server.tasks import TaskStore
+from a2a.types import Task
+
+GREEN_STATE_PATH = os.getenv("GREEN_STATE_PATH", "cache/green_state.sqlite3")
+CHECKPOINT_TTL = float(os.getenv("CHECKPOINT_TTL", str(7 * 24 * 3600)))
+# a2a_tasks 按最后更新时间过期，并限制总行数
+GREEN_TASK_TTL = float(os.getenv("GREEN_TASK_TTL", str(7 * 24 * 3600)))
+GREEN_TASK_MAX_ROWS = int(os.getenv("GREEN_TASK_MAX_ROWS", "10000"))
+# 每写入这么多次清理一次
+GREEN_TASK_PRUNE_EVERY = 256
+
+
+def evaluation_fingerprint(purple_url: str, judge_mode: str, task_count: int, seed: Optional[int]) -> str:
+    """
+    Digest of the settings a checkpoint is only valid for.
+    """
+    config = {"purple_url": purple_url, "judge_mode": judge_mode, "task_count": task_count, "seed": seed}
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class SQLiteTaskStore(TaskStore):
+    """
+    A2A task store persisted as one JSON row per task, pruned by age and row count.
+    SQLite calls run in a worker thread so they never block the event loop.
+    """
+
+    def __init__(self, path: str = GREEN_STATE_PATH, ttl: float = GREEN_TASK_TTL, max_rows: int = GREEN_TASK_MAX_ROWS):
+        self.path = path
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = _connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS a2a_tasks ("
+            " id TEXT PRIMARY KEY,"
+            " context_id TEXT NOT NULL,"
+            " state TEXT NOT NULL,"
+            " task TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_a2a_tasks_updated ON a2a_tasks(updated_at)")
+        self._conn.commit()
+        self.prune()
+
+    def _prune(self, now: float):
+        if self.ttl > 0:
+            self._conn.execute("DELETE FROM a2a_tasks WHERE updated_at < ?", (now - self.ttl,))
+        if self.max_rows > 0:
+            self._conn.execute(
+                "DELETE FROM a2a_tasks WHERE id IN ("
+                " SELECT id FROM a2a_tasks ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_rows,),
+            )
+
+    def prune(self):
+        with self._lock:
+            self._prune(time.time())
+            self._conn.commit()
+
+    def _save(self, task: Task):
+        now = time.time()
+        data = task.model_dump_json(exclude_none=True)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO a2a_tasks (id, context_id, state, task, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (task.id, task.context_id, task.status.state.value, data, now),
+            )
+            self._writes += 1
+            if self._writes % GREEN_TASK_PRUNE_EVERY == 0:
+                self._prune(now)
+            self._conn.commit()
+
+    def _get(self, task_id: str) -> Optional[Task]:
+        with self._lock:
+            row = self._conn.execute("SELECT task FROM a2a_tasks WHERE id = ?", (task_id,)).fetchone()
+        return Task.model_validate_json(row[0]) if row else None
+
+    def _delete(self, task_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM a2a_tasks WHERE id = ?", (task_id,))
+            self._conn.commit()
+
+    async def save(self, task: Task, context: Optional[ServerCallContext] = None) -> None:
+        await asyncio.to_thread(self._save, task)
+
+    async def get(self, task_id: str, context: Optional[ServerCallContext] = None) -> Optional[Task]:
+        return await asyncio.to_thread(self._get, task_id)
+
+    async def delete(self, task_id: str, context: Optional[ServerCallContext] = None) -> None:
+        await asyncio.to_thread(self._delete, task_id)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CheckpointStore:
+    """
+    Per-(context, persona) task list and per-task results, written as each task is scored.
+
+    Methods block on SQLite; async callers run them via ``asyncio.to_thread``.
+    """
+
+    def __init__(self, path: str = GREEN_STATE_PATH, ttl: float = CHECKPOINT_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = _connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS eval_tasks ("
+            " context_id TEXT NOT NULL,"
+            " persona TEXT NOT NULL,"
+            " tasks TEXT NOT NULL,"
+            " task_source TEXT NOT NULL,"
+            " fingerprint TEXT NOT NULL DEFAULT '',"
+            " created_at REAL NOT NULL,"
+            " PRIMARY KEY (context_id, persona))"
+        )
+        # 旧版本建的表没有 fingerprint 列：补上，空值永远匹配不上，旧检查点不会被续跑
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(eval_tasks)")}
+        if "fingerprint" not in columns:
+            self._conn.execute("ALTER TABLE eval_tasks ADD COLUMN fingerprint TEXT NOT NULL DEFAULT ''")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS eval_results ("
+            " context_id TEXT NOT NULL,"
+            " persona TEXT NOT NULL,"
+            " task_index INTEGER NOT NULL,"
+            " result TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " PRIMARY KEY (context_id, persona, task_index))"
+        )
+        self._conn.commit()
+        self.purge_expired()
+
+    def load_tasks(self, context_id: str, persona: str, fingerprint: str):
+        """
+        (tasks, task_source) stored for this evaluation, or None when there is none
+        or it was made with a different config (see evaluation_fingerprint).
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT tasks, task_source, fingerprint FROM eval_tasks WHERE context_id = ? AND persona = ?",
+                (context_id, persona),
+            ).fetchone()
+        if row is None or row[2] != fingerprint:
+            return None
+        return json.loads(row[0]), json.loads(row[1])
+
+    def save_tasks(self, context_id: str, persona: str, tasks: List[Dict[str, Any]], task_source: Dict[str, Any], fingerprint: str):
+        with self._lock:
+            # 任务列表变了，之前的结果不再对应，一起清掉
+            self._conn.execute(
+                "DELETE FROM eval_results WHERE context_id = ? AND persona = ?", (context_id, persona)
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO eval_tasks (context_id, persona, tasks, task_source, fingerprint, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (context_id, persona, json.dumps(tasks, ensure_ascii=False), json.dumps(task_source), fingerprint, time.time()),
+            )
+            self._conn.commit()
+
+    def load_results(self, context_id: str, persona: str) -> Dict[int, Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT task_index, result FROM eval_results WHERE context_id = ? AND persona = ?",
+                (context_id, persona),
+            ).fetchall()
+        return {index: json.loads(result) for index, result in rows}
+
+    def save_result(self, context_id: str, persona: str, index: int, result: Dict[str, Any]):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO eval_results (context_id, persona, task_index, result, created_at) VALUES (?, ?, ?, ?, ?)",
+                (context_id, persona, index, json.dumps(result, ensure_ascii=False), time.time()),
+            )
+            self._conn.commit()
+
+    def clear(self, context_id: str, persona: str):
+        """
+        Drop a finished evaluation, so only interrupted runs are resumed.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM eval_results WHERE context_id = ? AND persona = ?", (context_id, persona))
+            self._conn.execute("DELETE FROM eval_tasks WHERE context_id = ? AND persona = ?", (context_id, persona))
+            self._conn.commit()
+
+    def purge_expired(self):
+        if self.ttl <= 0:
+            return
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            self._conn.execute("DELETE FROM eval_results WHERE created_at < ?", (cutoff,))
+            self._conn.execute("DELETE FROM eval_tasks WHERE created_at < ?", (cutoff,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_checkpoints: Optional[CheckpointStore] = None
+_checkpoints_lock = threading.Lock()
+
+
+def get_checkpoints() -> CheckpointStore:
+    global _checkpoints
+    if _checkpoints is None:
+        with _checkpoints_lock:
+            if _checkpoints is None:
+                _checkpoints = CheckpointStore()
+    return _checkpoints
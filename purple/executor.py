@@ -1,69 +1,79 @@
-# agentbeats/purple/executor.py
-
-from a2a.server.agent_execution import AgentExecutor, RequestContext
-from a2a.server.events import EventQueue
-from a2a.server.tasks import TaskUpdater
-from a2a.types import Task, TaskState, UnsupportedOperationError, InvalidRequestError
-from a2a.utils.errors import ServerError
-from a2a.utils import new_agent_text_message, new_task
-
-from purple_agent import BaselinePurpleAgent
-
-TERMINAL_STATES = {
-    TaskState.completed,
-    TaskState.canceled,
-    TaskState.failed,
-    TaskState.rejected
-}
-
-class Executor(AgentExecutor):
-
-    
-    def __init__(self):
-
-        self.agents: dict[str, BaselinePurpleAgent] = {}
-    
-    async def execute(self, context: RequestContext, event_queue: EventQueue) -> None:
-
-        msg = context.message
-        if not msg:
-            raise ServerError(error=InvalidRequestError(message="Missing message"))
-        
-
-        task = context.current_task
-        if task and task.status.state in TERMINAL_STATES:
-            raise ServerError(error=InvalidRequestError(
-                message=f"Task {task.id} already processed (state: {task.status.state})"
-            ))
-        
-
-        if not task:
-            task = new_task(msg)
-            await event_queue.enqueue_event(task)
-        
-
-        context_id = task.context_id
-        agent = self.agents.get(context_id)
-        if not agent:
-            agent = BaselinePurpleAgent()
-            self.agents[context_id] = agent
-        
-
-        updater = TaskUpdater(event_queue, task.id, context_id)
-        await updater.start_work()
-        
-        try:
-
-            await agent.run(msg, updater)
-            
-
-            if not updater._terminal_state_reached:
-                await updater.complete()
-                
-        except Exception as e:
-
-            await updater.failed(new_agent_text_message(f"Agent error: {e}"))
-    
-    async def cancel(self, context: RequestContext, event_queue: EventQueue) -> None:
-
+# agentbeats/purple/executor.py
+
+from typing import Callable
+
+from a2a.server.agent_execution import AgentExecutor, RequestContext
+from a2a.server.events import EventQueue
+from a2a.server.tasks import TaskUpdater
+from a2a.types import Task, TaskState, UnsupportedOperationError, InvalidRequestError
+from a2a.utils.errors import ServerError
+from a2a.utils import new_agent_text_message, new_task
+
+from purple_agent import BaselinePurpleAgent
+from task_store import LRUCache, PURPLE_CONTEXT_TTL, PURPLE_MAX_CONTEXTS
+
+TERMINAL_STATES = {
+    TaskState.completed,
+    TaskState.canceled,
+    TaskState.failed,
+    TaskState.rejected
+}
+
+class Executor(AgentExecutor):
+
+    
+    def __init__(
+        self,
+        agent_factory: Callable[[], BaselinePurpleAgent] = BaselinePurpleAgent,
+        max_contexts: int = PURPLE_MAX_CONTEXTS,
+        context_ttl: float = PURPLE_CONTEXT_TTL,
+    ):
+
+        # 每个 context 一个 agent，按 LRU + 空闲 TTL 淘汰，长时间运行内存不增长
+        self.agents: LRUCache[BaselinePurpleAgent] = LRUCache(max_contexts, context_ttl)
+        self.agent_factory = agent_factory
+    
+    async def execute(self, context: RequestContext, event_queue: EventQueue) -> None:
+
+        msg = context.message
+        if not msg:
+            raise ServerError(error=InvalidRequestError(message="Missing message"))
+        
+
+        task = context.current_task
+        if task and task.status.state in TERMINAL_STATES:
+            raise ServerError(error=InvalidRequestError(
+                message=f"Task {task.id} already processed (state: {task.status.state})"
+            ))
+        
+
+        if not task:
+            task = new_task(msg)
+            await event_queue.enqueue_event(task)
+        
+
+        context_id = task.context_id
+        agent = self.agents.get(context_id)
+        if not agent:
+            agent = self.agent_factory()
+            self.agents.put(context_id, agent)
+        
+
+        updater = TaskUpdater(event_queue, task.id, context_id)
+        await updater.start_work()
+        
+        try:
+
+            await agent.run(msg, updater)
+            
+
+            if not updater._terminal_state_reached:
+                await updater.complete()
+                
+        except Exception as e:
+
+            await updater.failed(new_agent_text_message(f"Agent error: {e}"))
+    
+    async def cancel(self, context: RequestContext, event_queue: EventQueue) -> None:
+
         raise ServerError(error=UnsupportedOperationError())
\ No newline at end of file
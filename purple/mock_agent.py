@@ -0,0 +1,69 @@
+# agentbeats/purple/mock_agent.py
+
+import asyncio
+import random
+
+from a2a.server.tasks import TaskUpdater
+from a2a.types import Message
+from a2a.utils import new_agent_text_message
+
+from purple_agent import BaselinePurpleAgent
+
+
+class LatencyModel:
+    """
+    Parses ``fixed:ms``, ``uniform:lo_ms,hi_ms``, ``normal:mean_ms,std_ms`` or ``lognormal:median_ms,sigma``.
+
+    Deliberately duplicated in green/mock_llm.py: green and purple are packaged as separate
+    images and cannot import each other. Keep the two copies in sync.
+    """
+
+    def __init__(self, spec: str = "fixed:0", rng: random.Random = None):
+        kind, _, args = spec.partition(":")
+        self.kind = kind or "fixed"
+        self.args = [float(x) for x in args.split(",") if x.strip()] or [0.0]
+        self.rng = rng or random.Random(0)
+
+    def sample(self) -> float:
+        a = self.args
+        if self.kind == "uniform":
+            ms = self.rng.uniform(a[0], a[1] if len(a) > 1 else a[0])
+        elif self.kind == "normal":
+            ms = self.rng.gauss(a[0], a[1] if len(a) > 1 else 0.0)
+        elif self.kind == "lognormal":
+            ms = a[0] * self.rng.lognormvariate(0.0, a[1] if len(a) > 1 else 0.5)
+        else:
+            ms = a[0]
+        return max(0.0, ms) / 1000.0
+
+
+class MockPurpleAgent(BaselinePurpleAgent):
+    """
+    Baseline agent with injected latency and failures, for load-testing green offline.
+    """
+
+    def __init__(self, latency: LatencyModel, error_rate: float, rng: random.Random):
+        super().__init__()
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = rng
+
+    async def run(self, message: Message, updater: TaskUpdater) -> None:
+        await asyncio.sleep(self.latency.sample())
+
+        if self.rng.random() < self.error_rate:
+            await updater.failed(new_agent_text_message("Mock injected failure"))
+            return
+
+        await super().run(message, updater)
+
+
+def mock_agent_factory(latency: str = "fixed:0", error_rate: float = 0.0, seed: int = 0):
+    # 所有会话共用同一个随机源，整个进程的延迟/错误序列可复现
+    rng = random.Random(seed)
+    latency_model = LatencyModel(latency, rng)
+
+    def factory() -> MockPurpleAgent:
+        return MockPurpleAgent(latency_model, error_rate, rng)
+
+    return factory
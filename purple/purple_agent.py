@@ -1,64 +1,161 @@
-# agentbeats/purple/purple_agent.py
-
-import json
-from typing import Dict, Any
-
-from a2a.server.tasks import TaskUpdater
-from a2a.types import Message, TaskState, Part, TextPart, DataPart
-from a2a.utils import get_message_text, new_agent_text_message
-
-
-class BaselinePurpleAgent:
-
-
-    async def run(self, message: Message, updater: TaskUpdater) -> None:
-
-        try:
-
-            raw_text = get_message_text(message)
-            task: Dict[str, Any] = json.loads(raw_text)
-            
-        except json.JSONDecodeError as e:
-
-            await updater.reject(
-                new_agent_text_message(f"Invalid JSON format: {e}")
-            )
-            return
-        except Exception as e:
-
-            await updater.reject(
-                new_agent_text_message(f"Invalid input: {e}")
-            )
-            return
-
-
-        task_input = task.get("input", {})
-        
-
-        candidates = task_input.get("candidate_items", [])
-        
-        if candidates:
-
-            prediction = [str(x) for x in candidates[:5]]
-            explanation = "Returned top-5 candidate items."
-        else:
-
-            prediction = []
-            explanation = "No candidate items provided."
-
-
-        await updater.add_artifact(
-            name="prediction",
-            parts=[
-                Part(root=DataPart(data={
-                    "prediction": prediction,
-                    "explanation": explanation
-                }))
-            ],
-        )
-
-
-        await updater.update_status(
-            TaskState.completed,
-            new_agent_text_message("Prediction completed successfully")
-        )
\ No newline at end of file
+# agentbeats/purple/purple_agent.py
+
+import json
+from typing import Dict, Any, List
+
+from a2a.server.tasks import TaskUpdater
+from a2a.types import Message, TaskState, Part, TextPart, DataPart
+from a2a.utils import get_message_text, new_agent_text_message
+
+from ranker import DEFAULT_K, Ranker, get_ranker
+from retrieval import PURPLE_RETRIEVAL_FANOUT, PURPLE_RETRIEVAL_MIN, get_index
+
+
+class BaselinePurpleAgent:
+
+    def __init__(self, ranker: Ranker = None):
+        # 所有 context 共用一个 ranker（以及它的 item embedding 缓存）
+        self.ranker = ranker or get_ranker()
+
+    @staticmethod
+    def parse_task(message: Message) -> Dict[str, Any]:
+        # 优先读取 DataPart；只有纯文本消息才走 json.loads
+        for part in message.parts:
+            if isinstance(part.root, DataPart) and isinstance(part.root.data, dict):
+                return part.root.data
+        return json.loads(get_message_text(message))
+
+    async def run(self, message: Message, updater: TaskUpdater) -> None:
+
+        try:
+
+            task: Dict[str, Any] = self.parse_task(message)
+            
+        except json.JSONDecodeError as e:
+
+            await updater.reject(
+                new_agent_text_message(f"Invalid JSON format: {e}")
+            )
+            return
+        except Exception as e:
+
+            await updater.reject(
+                new_agent_text_message(f"Invalid input: {e}")
+            )
+            return
+
+
+        # 批量协议：{"tasks": [...]}，每个任务各返回一个 prediction artifact
+        if isinstance(task.get("tasks"), list):
+            await self.run_batch(task["tasks"], updater)
+            return
+
+        await updater.add_artifact(
+            name="prediction",
+            parts=[Part(root=DataPart(data=self.predict(task)))],
+        )
+
+
+        await updater.update_status(
+            TaskState.completed,
+            new_agent_text_message("Prediction completed successfully")
+        )
+
+    async def run_batch(self, tasks: List[Dict[str, Any]], updater: TaskUpdater) -> None:
+
+        for index, task in enumerate(tasks):
+            prediction = self.predict(task if isinstance(task, dict) else {})
+            prediction["index"] = index
+            prediction["task_id"] = task.get("task_id") if isinstance(task, dict) else None
+
+            await updater.add_artifact(
+                name=f"prediction-{index}",
+                parts=[Part(root=DataPart(data=prediction))],
+            )
+
+        await updater.update_status(
+            TaskState.completed,
+            new_agent_text_message(f"Predictions completed successfully ({len(tasks)} tasks)")
+        )
+
+    def predict(self, task: Dict[str, Any]) -> Dict[str, Any]:
+
+        task_input = task.get("input", {})
+        if not isinstance(task_input, dict):
+            task_input = {}
+
+        candidates = task_input.get("candidate_items") or []
+        history = [str(h) for h in task_input.get("history") or []]
+        persona = task_input.get("persona") or {}
+        try:
+            k = max(1, int(task_input.get("k") or DEFAULT_K))
+        except (TypeError, ValueError):
+            k = DEFAULT_K
+
+        retrieved = False
+        if not candidates:
+            # 没给候选：先从目录索引里召回，再走同一套排序
+            candidates = self.retrieve(persona, history, k)
+            retrieved = bool(candidates)
+
+        ranked = self.ranker.rank([str(x) for x in candidates], persona, history, k) if candidates else []
+
+        if ranked:
+
+            prediction = [title for title, _ in ranked]
+            explanation = self.explain(ranked, persona, history, len(candidates))
+            if retrieved:
+                explanation = f"No candidate list was given, so candidates were retrieved from the catalog. {explanation}"
+        elif candidates:
+
+            # 候选全部在观看历史里：退回原顺序
+            prediction = [str(x) for x in candidates[:k]]
+            explanation = f"All candidates are already in the viewing history; returned the first {len(prediction)}."
+        else:
+
+            prediction = []
+            explanation = "No candidate items provided."
+
+        return {
+            "prediction": prediction,
+            "explanation": explanation
+        }
+
+    def retrieve(self, persona: Any, history: List[str], k: int) -> List[str]:
+
+        index = get_index()
+        if index is None:
+            return []
+        query = self.ranker.query_vector(persona, history)
+        hits = index.search(query, max(k * PURPLE_RETRIEVAL_FANOUT, PURPLE_RETRIEVAL_MIN), exclude=history)
+        return [title for title, _ in hits]
+
+    def explain(self, ranked, persona: Any, history: List[str], n_candidates: int) -> str:
+
+        prefs = persona.get("preferences") if isinstance(persona, dict) else None
+        if isinstance(prefs, str):
+            prefs = [prefs]
+        prefs = [str(p) for p in prefs or []]
+        wanted = {p.lower() for p in prefs}
+
+        reasons = []
+        for title, _ in ranked:
+            genres = self.ranker.item_genres(title)
+            matched = [g for g in genres if g.lower() in wanted]
+            if matched:
+                reasons.append(f"{title} ({', '.join(genres)}) matches the preference for {' and '.join(matched)}")
+            elif genres:
+                reasons.append(f"{title} ({', '.join(genres)}) adds variety")
+            else:
+                reasons.append(f"{title} is the closest remaining match")
+
+        basis = []
+        if prefs:
+            basis.append(f"preferred genres {', '.join(prefs)}")
+        if history:
+            basis.append(f"{len(history)} watched titles")
+        header = (
+            f"Ranked {n_candidates} candidates by similarity to "
+            f"{' and '.join(basis) if basis else 'the task'}, balancing relevance with diversity. "
+        )
+        return header + "; ".join(reasons) + "."
@@ -0,0 +1,196 @@
+# agentbeats/purple/ranker.py
+"""
+CPU ranking engine for the baseline purple agent, NumPy only.
+
+Items and the persona (preferences, description, watch history) are embedded
+with signed feature hashing over word unigrams and character trigrams. Item
+text is the title plus its genres when the title is in the local catalog, so
+"Drama" in a persona lines up with dramas in the candidate list. Candidates are
+scored with one matrix-vector product and re-ranked with MMR for diversity.
+Item vectors are cached, so a warm request costs well under a millisecond.
+"""
+
+import json
+import os
+import re
+import threading
+import unicodedata
+import zlib
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from task_store import LRUCache
+
+PURPLE_CATALOG_PATH = os.getenv(
+    "PURPLE_CATALOG_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "catalog.jsonl")
+)
+PURPLE_EMBEDDING_DIM = int(os.getenv("PURPLE_EMBEDDING_DIM", "512"))
+PURPLE_EMBEDDING_CACHE = int(os.getenv("PURPLE_EMBEDDING_CACHE", "50000"))
+# MMR 权衡：1.0 只看相关性，越小越强调多样性
+PURPLE_MMR_LAMBDA = float(os.getenv("PURPLE_MMR_LAMBDA", "0.7"))
+DEFAULT_K = 5
+
+# query 各部分的权重
+PREFERENCE_WEIGHT = 1.0
+DESCRIPTION_WEIGHT = 0.5
+HISTORY_WEIGHT = 0.7
+
+_YEAR_SUFFIX = re.compile(r"\s*[\(\[]?\b(19|20)\d{2}\b[\)\]]?\s*$")
+
+
+def fold_title(text: str) -> str:
+    text = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode("ascii")
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text.lower()).split())
+
+
+def _features(text: str) -> List[str]:
+    words = fold_title(text).split()
+    feats = ["w:" + w for w in words]
+    for w in words:
+        padded = f" {w} "
+        feats.extend("c:" + padded[i:i + 3] for i in range(len(padded) - 2))
+    return feats
+
+
+class HashingEmbedder:
+    """
+    Signed feature hashing into ``dim`` dimensions, L2-normalised; no weights to load.
+    """
+
+    def __init__(self, dim: int = PURPLE_EMBEDDING_DIM):
+        self.dim = dim
+
+    def embed(self, text: str, boost: Sequence[str] = ()) -> np.ndarray:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        feats = _features(text)
+        # genre 等元数据是强信号，按整词再加一遍
+        feats += ["w:" + fold_title(b) for b in boost for _ in range(2)]
+        for f in feats:
+            h = zlib.crc32(f.encode("utf-8"))
+            vec[h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm > 0 else vec
+
+
+class Ranker:
+    """
+    Persona-aware candidate ranking with an item-embedding cache shared by all contexts.
+    """
+
+    def __init__(
+        self,
+        catalog_path: str = PURPLE_CATALOG_PATH,
+        embedder: Optional[HashingEmbedder] = None,
+        cache_size: int = PURPLE_EMBEDDING_CACHE,
+        mmr_lambda: float = PURPLE_MMR_LAMBDA,
+    ):
+        self.embedder = embedder or HashingEmbedder()
+        self.mmr_lambda = mmr_lambda
+        self.genres: Dict[str, List[str]] = self._load_genres(catalog_path)
+        self._cache: LRUCache[np.ndarray] = LRUCache(cache_size, ttl=0)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load_genres(path: str) -> Dict[str, List[str]]:
+        genres: Dict[str, List[str]] = {}
+        if not path or not os.path.exists(path):
+            return genres
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                for name in [row["title"], *row.get("aliases", [])]:
+                    genres.setdefault(fold_title(name), row.get("genres", []))
+        return genres
+
+    def item_genres(self, title: str) -> List[str]:
+        key = fold_title(title)
+        found = self.genres.get(key)
+        if found is None:
+            found = self.genres.get(fold_title(_YEAR_SUFFIX.sub("", str(title))), [])
+        return found
+
+    def item_vectors(self, titles: Sequence[str]) -> np.ndarray:
+        out = np.empty((len(titles), self.embedder.dim), dtype=np.float32)
+        with self._lock:
+            for i, title in enumerate(titles):
+                key = fold_title(title)
+                vec = self._cache.get(key)
+                if vec is None:
+                    vec = self.embedder.embed(title, self.item_genres(title))
+                    self._cache.put(key, vec)
+                out[i] = vec
+        return out
+
+    def query_vector(self, persona: Any, history: Sequence[str]) -> np.ndarray:
+        q = np.zeros(self.embedder.dim, dtype=np.float32)
+        if isinstance(persona, dict):
+            prefs = persona.get("preferences") or []
+            if isinstance(prefs, str):
+                prefs = [prefs]
+            if prefs:
+                q += PREFERENCE_WEIGHT * self.embedder.embed(" ".join(map(str, prefs)), prefs)
+            if persona.get("description"):
+                q += DESCRIPTION_WEIGHT * self.embedder.embed(str(persona["description"]))
+        elif persona:
+            q += DESCRIPTION_WEIGHT * self.embedder.embed(str(persona))
+        if history:
+            q += HISTORY_WEIGHT * self.item_vectors(history).mean(axis=0)
+        norm = float(np.linalg.norm(q))
+        return q / norm if norm > 0 else q
+
+    def mmr(self, vectors: np.ndarray, relevance: np.ndarray, k: int) -> List[int]:
+        """
+        Greedy maximal marginal relevance; returns indices into ``vectors``.
+        """
+        n = len(relevance)
+        k = min(k, n)
+        if k <= 0:
+            return []
+        sim = vectors @ vectors.T
+        chosen = [int(np.argmax(relevance))]
+        max_sim = sim[chosen[0]].copy()
+        available = np.ones(n, dtype=bool)
+        available[chosen[0]] = False
+        while len(chosen) < k:
+            score = self.mmr_lambda * relevance - (1.0 - self.mmr_lambda) * max_sim
+            score[~available] = -np.inf
+            best = int(np.argmax(score))
+            chosen.append(best)
+            available[best] = False
+            np.maximum(max_sim, sim[best], out=max_sim)
+        return chosen
+
+    def rank(
+        self, candidates: Sequence[str], persona: Any, history: Sequence[str], k: int = DEFAULT_K
+    ) -> List[Tuple[str, float]]:
+        # 去重，并排除已看过的
+        seen = {fold_title(h) for h in history}
+        items: List[str] = []
+        for c in candidates:
+            key = fold_title(c)
+            if key and key not in seen:
+                seen.add(key)
+                items.append(str(c))
+        if not items:
+            return []
+
+        vectors = self.item_vectors(items)
+        relevance = vectors @ self.query_vector(persona, history)
+        order = self.mmr(vectors, relevance, k)
+        return [(items[i], float(relevance[i])) for i in order]
+
+
+_ranker: Optional[Ranker] = None
+_ranker_lock = threading.Lock()
+
+
+def get_ranker() -> Ranker:
+    global _ranker
+    if _ranker is None:
+        with _ranker_lock:
+            if _ranker is None:
+                _ranker = Ranker()
+    return _ranker
@@ -0,0 +1,234 @@
+# agentbeats/purple/retrieval.py
+"""
+Catalog retrieval for tasks that arrive without ``candidate_items``.
+
+An IVF (inverted file) index over the catalog's item embeddings, in pure NumPy:
+spherical k-means splits the items into ``n_lists`` clusters and the vectors are
+stored grouped by cluster. A query scores the centroids, scans only the
+``nprobe`` closest lists and returns the top-k titles.
+
+The arrays are written as ``.npy`` files and opened with ``mmap_mode="r"``, so
+every purple worker on the host maps the same pages instead of holding a copy.
+
+    python retrieval.py build [--catalog data/catalog.jsonl] [--out cache/index]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ranker import PURPLE_CATALOG_PATH, HashingEmbedder, fold_title
+
+PURPLE_INDEX_DIR = os.getenv(
+    "PURPLE_INDEX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "index")
+)
+# 0 = 按 sqrt(N) 自动选择
+PURPLE_INDEX_LISTS = int(os.getenv("PURPLE_INDEX_LISTS", "0"))
+PURPLE_INDEX_NPROBE = int(os.getenv("PURPLE_INDEX_NPROBE", "4"))
+# 召回后交给 ranker 做 MMR 的候选数 = max(k * 倍数, 下限)
+PURPLE_RETRIEVAL_FANOUT = int(os.getenv("PURPLE_RETRIEVAL_FANOUT", "4"))
+PURPLE_RETRIEVAL_MIN = int(os.getenv("PURPLE_RETRIEVAL_MIN", "20"))
+
+INDEX_FORMAT = 1
+
+
+def _catalog_digest(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+def _load_catalog(path: str) -> List[dict]:
+    rows = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                rows.append(json.loads(line))
+    return rows
+
+
+def _kmeans(X: np.ndarray, n_lists: int, iters: int = 20, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Spherical k-means on unit vectors; returns (centroids, assignment).
+    """
+    rng = np.random.default_rng(seed)
+    centroids = X[rng.choice(len(X), size=n_lists, replace=False)].copy()
+    assign = np.zeros(len(X), dtype=np.int64)
+    for _ in range(iters):
+        assign = np.argmax(X @ centroids.T, axis=1)
+        for j in range(n_lists):
+            members = X[assign == j]
+            if len(members) == 0:
+                # 空簇：用离当前中心最远的点重新播种
+                far = int(np.argmin(np.max(X @ centroids.T, axis=1)))
+                centroids[j] = X[far]
+                continue
+            c = members.sum(axis=0)
+            norm = float(np.linalg.norm(c))
+            centroids[j] = c / norm if norm > 0 else c
+    assign = np.argmax(X @ centroids.T, axis=1)
+    return centroids.astype(np.float32), assign
+
+
+def build_index(
+    catalog_path: str = PURPLE_CATALOG_PATH,
+    out_dir: str = PURPLE_INDEX_DIR,
+    n_lists: int = PURPLE_INDEX_LISTS,
+    embedder: Optional[HashingEmbedder] = None,
+    seed: int = 0,
+) -> dict:
+    embedder = embedder or HashingEmbedder()
+    rows = _load_catalog(catalog_path)
+    if not rows:
+        raise ValueError(f"Empty catalog: {catalog_path}")
+
+    X = np.stack([embedder.embed(r["title"], r.get("genres", [])) for r in rows]).astype(np.float32)
+    n_lists = n_lists or max(1, int(round(np.sqrt(len(rows)))))
+    n_lists = min(n_lists, len(rows))
+    centroids, assign = _kmeans(X, n_lists, seed=seed)
+
+    order = np.argsort(assign, kind="stable")
+    offsets = np.zeros(n_lists + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(assign, minlength=n_lists))
+
+    meta = {
+        "format": INDEX_FORMAT,
+        "dim": embedder.dim,
+        "n_items": len(rows),
+        "n_lists": n_lists,
+        "catalog_digest": _catalog_digest(catalog_path),
+        "built_at": time.time(),
+    }
+
+    # 先写临时目录再整体替换，多个 worker 同时构建也不会读到半成品
+    tmp_dir = f"{out_dir}.tmp-{os.getpid()}"
+    os.makedirs(tmp_dir, exist_ok=True)
+    np.save(os.path.join(tmp_dir, "vectors.npy"), X[order])
+    np.save(os.path.join(tmp_dir, "centroids.npy"), centroids)
+    np.save(os.path.join(tmp_dir, "offsets.npy"), offsets)
+    with open(os.path.join(tmp_dir, "titles.json"), "w", encoding="utf-8") as f:
+        json.dump([rows[i]["title"] for i in order], f, ensure_ascii=False)
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    if os.path.isdir(out_dir):
+        old_dir = f"{out_dir}.old-{os.getpid()}"
+        os.replace(out_dir, old_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+    try:
+        os.replace(tmp_dir, out_dir)
+    except OSError:
+        # 另一个 worker 抢先完成了构建
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return meta
+
+
+class IVFIndex:
+    """
+    Read-only IVF index over mmap-ed arrays.
+    """
+
+    def __init__(self, index_dir: str = PURPLE_INDEX_DIR, nprobe: int = PURPLE_INDEX_NPROBE):
+        with open(os.path.join(index_dir, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.vectors = np.load(os.path.join(index_dir, "vectors.npy"), mmap_mode="r")
+        self.centroids = np.load(os.path.join(index_dir, "centroids.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(index_dir, "offsets.npy"), mmap_mode="r")
+        with open(os.path.join(index_dir, "titles.json"), "r", encoding="utf-8") as f:
+            self.titles: List[str] = json.load(f)
+        self.nprobe = max(1, min(nprobe, len(self.centroids)))
+
+    @property
+    def dim(self) -> int:
+        return int(self.meta["dim"])
+
+    def search(self, query: np.ndarray, k: int, exclude: Sequence[str] = ()) -> List[Tuple[str, float]]:
+        """
+        Top-k (title, score) by inner product, skipping titles in ``exclude``.
+        """
+        if k <= 0:
+            return []
+        excluded = {fold_title(t) for t in exclude}
+        want = k + len(excluded)
+
+        probe = np.argsort(-(self.centroids @ query))[:self.nprobe]
+        spans = [(int(self.offsets[j]), int(self.offsets[j + 1])) for j in probe]
+        if sum(e - s for s, e in spans) < want:
+            # 探测的簇太小：退化为全量扫描
+            spans = [(0, len(self.titles))]
+
+        # 每个簇在文件里是连续的一段，按切片读，不做 fancy indexing
+        ids = np.concatenate([np.arange(s, e) for s, e in spans])
+        scores = np.concatenate([self.vectors[s:e] @ query for s, e in spans])
+        top = min(want, len(ids))
+        best = np.argpartition(-scores, top - 1)[:top]
+        best = best[np.argsort(-scores[best])]
+
+        results = []
+        for i in best:
+            title = self.titles[int(ids[i])]
+            if fold_title(title) in excluded:
+                continue
+            results.append((title, float(scores[i])))
+            if len(results) >= k:
+                break
+        return results
+
+
+def index_is_current(index_dir: str, catalog_path: str, dim: int) -> bool:
+    path = os.path.join(index_dir, "meta.json")
+    if not os.path.exists(path):
+        return False
+    with open(path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    return (
+        meta.get("format") == INDEX_FORMAT
+        and meta.get("dim") == dim
+        and meta.get("catalog_digest") == _catalog_digest(catalog_path)
+    )
+
+
+_index: Optional[IVFIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> Optional[IVFIndex]:
+    """
+    Shared index, built on first use when no prebuilt one matches the catalog.
+    None when there is no catalog to index.
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                if not os.path.exists(PURPLE_CATALOG_PATH):
+                    return None
+                dim = HashingEmbedder().dim
+                if not index_is_current(PURPLE_INDEX_DIR, PURPLE_CATALOG_PATH, dim):
+                    build_index()
+                _index = IVFIndex()
+    return _index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the purple catalog retrieval index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Build the IVF index from a catalog JSONL file")
+    build.add_argument("--catalog", default=PURPLE_CATALOG_PATH)
+    build.add_argument("--out", default=PURPLE_INDEX_DIR)
+    build.add_argument("--lists", type=int, default=PURPLE_INDEX_LISTS, help="Number of IVF lists (0 = sqrt(N))")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        meta = build_index(args.catalog, args.out, args.lists)
+        print(f"Built index: {meta['n_items']} items, {meta['n_lists']} lists, dim={meta['dim']} -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
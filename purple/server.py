@@ -1,81 +1,158 @@
-# agentbeats/purple/server.py
-
-import argparse
-import uvicorn
-
-from a2a.server.apps import A2AStarletteApplication
-from a2a.server.request_handlers import DefaultRequestHandler
-from a2a.server.tasks import InMemoryTaskStore
-from a2a.types import AgentCapabilities, AgentCard, AgentSkill
-
-from executor import Executor
-from starlette.responses import JSONResponse
-from starlette.routing import Route
-
-def main():
-
-    parser = argparse.ArgumentParser(description="Run the Purple Agent server.")
-    parser.add_argument("--host", type=str, default="127.0.0.1", help="Host to bind the server")
-    parser.add_argument("--port", type=int, default=9010, help="Port to bind the server")
-    parser.add_argument("--card-url", type=str, help="URL to advertise in the agent card")
-    args = parser.parse_args()
-
-
-    skill = AgentSkill(
-        id="baseline-purple-agent-v1",
-        name="Baseline Recommendation Agent",
-        description="Provides baseline recommendations by returning top-5 candidate items from the input list.",
-        tags=["recommendation", "baseline", "ranking", "candidate-selection"],
-        examples=[
-            "Input: {'input': {'candidate_items': ['A', 'B', 'C', 'D', 'E', 'F']}}",
-            "Output: {'prediction': ['A', 'B', 'C', 'D', 'E'], 'explanation': 'Returned top-5 candidate items.'}"
-        ]
-    )
-
-    base_url = args.card_url or f"http://{args.host}{args.port}"
-    base_url = base_url.rstrip("/") + "/"
-
-    agent_card = AgentCard(
-        name="Baseline Purple Agent",
-        description="A2A-compatible purple agent for baseline recommendation tasks. Returns top-5 items from candidate lists.",
-        url=base_url,
-        version='1.0.0',
-        default_input_modes=['text'],
-        default_output_modes=['text'],
-        capabilities=AgentCapabilities(streaming=True),
-        skills=[skill],
-        preferredTransport="JSONRPC",
-        protocolVersion="0.3.0"
-    )
-
-
-    request_handler = DefaultRequestHandler(
-        agent_executor=Executor(),
-        task_store=InMemoryTaskStore(),
-    )
-
-
-    server = A2AStarletteApplication(
-        agent_card=agent_card,
-        http_handler=request_handler,
-    )
-
-
-    print(f"Starting Purple Agent on http://{args.host}:{args.port}")
-    print(f"Agent Card: {agent_card.url}.well-known/agent-card.json")
-    app = server.build()
-
-
-    async def health(request):
-        return JSONResponse({"status": "ok", "agent": "green"})
-
-    app.router.routes.append(
-        Route("/health", endpoint=health, methods=["GET"])
-    )
-
-
-    uvicorn.run(app, host=args.host, port=args.port)
-
-
-if __name__ == '__main__':
-    main()
\ No newline at end of file
+# agentbeats/purple/server.py
+
+import argparse
+import json
+import os
+import uvicorn
+
+from a2a.server.apps import A2AStarletteApplication
+from a2a.server.request_handlers import DefaultRequestHandler
+from a2a.types import AgentCapabilities, AgentCard, AgentSkill
+
+from executor import Executor
+from mock_agent import mock_agent_factory
+from purple_agent import BaselinePurpleAgent
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from task_store import (
+    PURPLE_CONTEXT_TTL,
+    PURPLE_MAX_CONTEXTS,
+    PURPLE_TASK_SPILL_PATH,
+    SpillingTaskStore,
+)
+
+PURPLE_WORKERS = int(os.getenv("PURPLE_WORKERS", "1"))
+# 多 worker 时由 main() 写入，create_app() 在每个 worker 进程里读取
+SERVER_CONFIG_ENV = "PURPLE_SERVER_CONFIG"
+
+
+def build_app(
+    base_url: str,
+    mock: bool = False,
+    mock_latency: str = "fixed:0",
+    mock_error_rate: float = 0.0,
+    mock_seed: int = 0,
+    max_contexts: int = PURPLE_MAX_CONTEXTS,
+    context_ttl: float = PURPLE_CONTEXT_TTL,
+    task_spill: str = PURPLE_TASK_SPILL_PATH,
+):
+
+    skill = AgentSkill(
+        id="baseline-purple-agent-v1",
+        name="Baseline Recommendation Agent",
+        description="Ranks the candidate items against the persona's preferences, description and history, re-ranks for diversity (MMR) and returns the top-k.",
+        tags=["recommendation", "baseline", "ranking", "candidate-selection"],
+        examples=[
+            "Input: {'input': {'persona': {'preferences': ['Action']}, 'history': ['Heat'], 'candidate_items': ['A', 'B', 'C', 'D', 'E', 'F'], 'k': 3}}",
+            "Output: {'prediction': ['D', 'A', 'F'], 'explanation': 'Ranked 6 candidates by similarity to ...'}"
+        ]
+    )
+
+    batch_skill = AgentSkill(
+        id="baseline-purple-agent-batch-v1",
+        name="Batch Recommendation",
+        description="Accepts a DataPart {'tasks': [task, ...]} and returns one prediction artifact per task, tagged with its index in the batch.",
+        tags=["recommendation", "batch-tasks"],
+        examples=[
+            "Input: {'tasks': [{'task_id': 't1', 'input': {...}}, {'task_id': 't2', 'input': {...}}]}",
+            "Output artifacts: {'index': 0, 'task_id': 't1', 'prediction': [...], 'explanation': '...'}, ..."
+        ]
+    )
+
+    agent_card = AgentCard(
+        name="Baseline Purple Agent",
+        description="A2A-compatible purple agent for baseline recommendation tasks. Ranks candidate lists for the persona and returns the top-k items.",
+        url=base_url,
+        version='1.0.0',
+        default_input_modes=['text', 'application/json'],
+        default_output_modes=['text', 'application/json'],
+        capabilities=AgentCapabilities(streaming=True),
+        skills=[skill, batch_skill],
+        preferredTransport="JSONRPC",
+        protocolVersion="0.3.0"
+    )
+
+
+    if mock:
+        agent_factory = mock_agent_factory(mock_latency, mock_error_rate, mock_seed)
+        print(f"Mock mode: latency={mock_latency}, error_rate={mock_error_rate}")
+    else:
+        agent_factory = BaselinePurpleAgent
+
+    request_handler = DefaultRequestHandler(
+        agent_executor=Executor(agent_factory, max_contexts=max_contexts, context_ttl=context_ttl),
+        task_store=SpillingTaskStore(spill_path=task_spill),
+    )
+
+
+    server = A2AStarletteApplication(
+        agent_card=agent_card,
+        http_handler=request_handler,
+    )
+
+
+    app = server.build()
+
+
+    async def health(request):
+        return JSONResponse({"status": "ok", "agent": "green"})
+
+    app.router.routes.append(
+        Route("/health", endpoint=health, methods=["GET"])
+    )
+
+    return app
+
+
+def create_app():
+    """
+    uvicorn app factory for ``--workers > 1``: each worker process builds its own app
+    from the config main() left in the environment.
+    """
+    return build_app(**json.loads(os.environ[SERVER_CONFIG_ENV]))
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Run the Purple Agent server.")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Host to bind the server")
+    parser.add_argument("--port", type=int, default=9010, help="Port to bind the server")
+    parser.add_argument("--card-url", type=str, help="URL to advertise in the agent card")
+    parser.add_argument("--mock", action="store_true", help="Run as a fake purple agent with injected latency/errors (load testing)")
+    parser.add_argument("--mock-latency", type=str, default="fixed:0", help="e.g. fixed:50, uniform:20,200, lognormal:80,0.6")
+    parser.add_argument("--mock-error-rate", type=float, default=0.0)
+    parser.add_argument("--mock-seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=PURPLE_WORKERS, help="Number of uvicorn worker processes")
+    parser.add_argument("--max-contexts", type=int, default=PURPLE_MAX_CONTEXTS, help="Max per-context agents kept per worker (LRU)")
+    parser.add_argument("--context-ttl", type=float, default=PURPLE_CONTEXT_TTL, help="Seconds an idle context agent is kept")
+    parser.add_argument("--task-spill", type=str, default=PURPLE_TASK_SPILL_PATH,
+                        help="SQLite file for finished tasks (shared by workers); empty = drop them once finished")
+    args = parser.parse_args()
+
+    base_url = args.card_url or f"http://{args.host}:{args.port}"
+    base_url = base_url.rstrip("/") + "/"
+
+    config = {
+        "base_url": base_url,
+        "mock": args.mock,
+        "mock_latency": args.mock_latency,
+        "mock_error_rate": args.mock_error_rate,
+        "mock_seed": args.mock_seed,
+        "max_contexts": args.max_contexts,
+        "context_ttl": args.context_ttl,
+        "task_spill": args.task_spill,
+    }
+
+    print(f"Starting Purple Agent on http://{args.host}:{args.port} (workers={args.workers})")
+    print(f"Agent Card: {base_url}.well-known/agent-card.json")
+
+    if args.workers > 1:
+        # 多进程需要 import 字符串 + factory，配置经环境变量传给子进程
+        os.environ[SERVER_CONFIG_ENV] = json.dumps(config)
+        uvicorn.run("server:create_app", factory=True, host=args.host, port=args.port, workers=args.workers)
+    else:
+        uvicorn.run(build_app(**config), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+# agentbeats/purple/task_store.py
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Generic, Optional, TypeVar
+
+from a2a.server.context import ServerCallContext
+from a2a.server.tasks import TaskStore
+from a2a.types import Task, TaskState
+
+V = TypeVar("V")
+
+TERMINAL_STATES = {
+    TaskState.completed,
+    TaskState.canceled,
+    TaskState.failed,
+    TaskState.rejected
+}
+
+PURPLE_MAX_CONTEXTS = int(os.getenv("PURPLE_MAX_CONTEXTS", "1024"))
+PURPLE_CONTEXT_TTL = float(os.getenv("PURPLE_CONTEXT_TTL", "600"))
+PURPLE_MAX_ACTIVE_TASKS = int(os.getenv("PURPLE_MAX_ACTIVE_TASKS", "4096"))
+# 终态任务写到这个 SQLite 文件；为空时直接丢弃
+PURPLE_TASK_SPILL_PATH = os.getenv("PURPLE_TASK_SPILL_PATH", "")
+PURPLE_TASK_SPILL_TTL = float(os.getenv("PURPLE_TASK_SPILL_TTL", "3600"))
+PURPLE_TASK_SPILL_MAX = int(os.getenv("PURPLE_TASK_SPILL_MAX", "100000"))
+
+
+class LRUCache(Generic[V]):
+    """
+    Size- and idle-time-bounded mapping; the least recently used entry is dropped first.
+    """
+
+    def __init__(self, max_entries: int = PURPLE_MAX_CONTEXTS, ttl: float = PURPLE_CONTEXT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._items: "OrderedDict[str, tuple[V, float]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[V]:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        value, last_used = item
+        if self.ttl > 0 and time.monotonic() - last_used > self.ttl:
+            del self._items[key]
+            return None
+        self._items[key] = (value, time.monotonic())
+        self._items.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: V):
+        self._items[key] = (value, time.monotonic())
+        self._items.move_to_end(key)
+        self._evict()
+
+    def pop(self, key: str) -> Optional[V]:
+        item = self._items.pop(key, None)
+        return item[0] if item else None
+
+    def _evict(self):
+        if self.ttl > 0:
+            cutoff = time.monotonic() - self.ttl
+            # OrderedDict 按最近使用排序，过期项都在头部
+            while self._items:
+                key, (_, last_used) = next(iter(self._items.items()))
+                if last_used >= cutoff:
+                    break
+                del self._items[key]
+        while self.max_entries > 0 and len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+
+class SpillingTaskStore(TaskStore):
+    """
+    Active tasks in memory (LRU-bounded); tasks reaching a terminal state leave memory and are
+    either dropped or spilled to a SQLite file (TTL- and count-bounded). A spill file shared by
+    several workers lets any of them answer ``tasks/get`` for a finished task. Spill-file I/O
+    runs in a worker thread, so lock or busy-timeout waits never stall the event loop.
+    """
+
+    def __init__(
+        self,
+        spill_path: str = PURPLE_TASK_SPILL_PATH,
+        max_active: int = PURPLE_MAX_ACTIVE_TASKS,
+        spill_ttl: float = PURPLE_TASK_SPILL_TTL,
+        spill_max: int = PURPLE_TASK_SPILL_MAX,
+    ):
+        self._active: LRUCache[Task] = LRUCache(max_active, ttl=0)
+        self.spill_path = spill_path
+        self.spill_ttl = spill_ttl
+        self.spill_max = spill_max
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._spilled = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.spill_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.spill_path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS purple_tasks ("
+                " id TEXT PRIMARY KEY,"
+                " task TEXT NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_purple_tasks_created ON purple_tasks(created_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _spill(self, task: Task):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO purple_tasks (id, task, created_at) VALUES (?, ?, ?)",
+                (task.id, task.model_dump_json(exclude_none=True), now),
+            )
+            self._spilled += 1
+            # 每 256 次写入清理一次过期 / 超量记录
+            if self._spilled % 256 == 0:
+                if self.spill_ttl > 0:
+                    conn.execute("DELETE FROM purple_tasks WHERE created_at < ?", (now - self.spill_ttl,))
+                if self.spill_max > 0:
+                    conn.execute(
+                        "DELETE FROM purple_tasks WHERE id IN ("
+                        " SELECT id FROM purple_tasks ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                        (self.spill_max,),
+                    )
+            conn.commit()
+
+    def _load(self, task_id: str) -> Optional[Task]:
+        with self._lock:
+            row = self._connect().execute("SELECT task FROM purple_tasks WHERE id = ?", (task_id,)).fetchone()
+        return Task.model_validate_json(row[0]) if row else None
+
+    def _remove(self, task_id: str):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM purple_tasks WHERE id = ?", (task_id,))
+            conn.commit()
+
+    async def save(self, task: Task, context: Optional[ServerCallContext] = None) -> None:
+        if task.status.state in TERMINAL_STATES:
+            self._active.pop(task.id)
+            if self.spill_path:
+                await asyncio.to_thread(self._spill, task)
+            return
+        self._active.put(task.id, task)
+
+    async def get(self, task_id: str, context: Optional[ServerCallContext] = None) -> Optional[Task]:
+        task = self._active.get(task_id)
+        if task is not None or not self.spill_path:
+            return task
+        return await asyncio.to_thread(self._load, task_id)
+
+    async def delete(self, task_id: str, context: Optional[ServerCallContext] = None) -> None:
+        self._active.pop(task_id)
+        if self.spill_path:
+            await asyncio.to_thread(self._remove, task_id)